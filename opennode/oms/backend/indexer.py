@@ -55,7 +55,7 @@ class IndexerDaemonProcess(DaemonProcess):
         if self.queue:
             yield self._process()
 
-    @db.transact
+    @db.transact(pool='background')
     def _process(self):
         log.msg("indexing a batch of objects", system="indexer")
 
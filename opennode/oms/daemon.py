@@ -22,6 +22,25 @@ from twisted.python import log
 _daemon_started = False
 
 
+# the server stores the records as sent by the clients, which may have compressed
+# them (see `[db] compression`), but needs to decompress them when packing in order
+# to follow the references
+ZEO_CONF = """\
+%%import zc.zlibstorage
+
+<zeo>
+  address %(db)s/socket
+</zeo>
+
+<serverzlibstorage>
+  <filestorage>
+    path %(db)s/data.fs
+    blob-dir %(blob_dir)s
+  </filestorage>
+</serverzlibstorage>
+"""
+
+
 def get_base_dir():
     """Locates the base directory containing  opennode/oms.tac"""
     for i in opennode.__path__:
@@ -38,8 +57,12 @@ def run_zeo(db):
     if not os.path.exists('bin/runzeo'):
         runzeo = 'runzeo'
 
+    from opennode.oms.zodb.db import get_blob_dir
+    with open('%s/zeo.conf' % db, 'w') as f:
+        f.write(ZEO_CONF % dict(db=db, blob_dir=get_blob_dir()))
+
     pm = ProcessMonitor()
-    pm.addProcess('zeo', ['/bin/sh', '-c', '%s -f %s/data.fs -a %s/socket >%s/zeo.log 2>&1' % (runzeo, db, db, db)], env=os.environ)
+    pm.addProcess('zeo', ['/bin/sh', '-c', '%s -C %s/zeo.conf >%s/zeo.log 2>&1' % (runzeo, db, db)], env=os.environ)
     pm.startService()
 
 
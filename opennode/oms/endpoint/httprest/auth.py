@@ -16,7 +16,6 @@ from opennode.oms.model.model.root import OmsRoot
 from opennode.oms.endpoint.httprest.base import HttpRestView
 from opennode.oms.endpoint.httprest.root import BadRequest, Unauthorized, Forbidden
 from opennode.oms.security.authentication import checkers, KeystoneChecker
-from opennode.oms.util import blocking_yield
 
 
 log = logging.getLogger(__name__)
@@ -181,11 +180,9 @@ class AuthView(HttpRestView):
                       % ISessionStorage(session).username)
             return {'status': 'success'}
         if keystone_credentials:
-            return blocking_yield(auth_utility.authenticate_keystone(request, keystone_credentials))
+            return auth_utility.authenticate_keystone(request, keystone_credentials)
 
-        # XXX: refactor HttpRestServer.handle_request so that it's not a db.transact
-        # so that we can use a defer.inlineCallback here
-        return blocking_yield(auth_utility.authenticate(request, credentials, basic_auth))
+        return auth_utility.authenticate(request, credentials, basic_auth)
 
 
 class LogoutView(HttpRestView):
@@ -24,14 +24,22 @@ class HttpRestView(Adapter):
     baseclass()
     require('rest')
 
-    __builtin_attributes__ = ['id', 'children']
+    __builtin_attributes__ = ['id', 'children', 'next']
 
-    def filter_attributes(self, request, data):
-        """Handle the filtering of attributes according to the 'attrs' parameter in the request"""
+    def requested_attributes(self, request):
+        """Returns the attributes selected with the 'attrs' parameter in the request (plus the builtin
+        ones), None if all of them are requested. Views can skip computing the others."""
         attrs = request.args.get('attrs', [''])[0]
         if attrs:
+            return set(attrs.decode('utf-8').split(',') + self.__builtin_attributes__)
+        return None
+
+    def filter_attributes(self, request, data):
+        """Handle the filtering of attributes according to the 'attrs' parameter in the request"""
+        attrs = self.requested_attributes(request)
+        if attrs is not None:
             filtered_data = {}
-            for a in attrs.decode('utf-8').split(',') + self.__builtin_attributes__:
+            for a in attrs:
                 if a in data:
                     filtered_data[a] = data[a]
             return filtered_data
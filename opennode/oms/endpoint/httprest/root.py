@@ -2,13 +2,15 @@ import functools
 import json
 import zope.security.interfaces
 
-from twisted.internet import defer
+from twisted.internet import defer, task
+from twisted.internet.interfaces import IPushProducer
 from twisted.python import log, failure
 from twisted.web import resource
 from twisted.web.server import NOT_DONE_YET
 from twisted.python.compat import intToBytes
 
 from zope.component import queryAdapter, getUtility
+from zope.interface import implements
 
 from opennode.oms.config import get_config
 from opennode.oms.endpoint.httprest.base import IHttpRestView, IHttpRestSubViewFactory
@@ -95,6 +97,76 @@ class MethodNotAllowed(HttpStatus):
         self.headers = {'Allow': ','.join(allow)}
 
 
+class JsonProducer(object):
+    """Writes the JSON encoding of `data` to the request in chunks of about `chunk_size` bytes.
+
+    The encoding runs as a cooperative task, so that the reactor serves other requests (and ssh
+    sessions) in between; it pauses while the transport cannot keep up with the client.
+
+    """
+    implements(IPushProducer)
+
+    def __init__(self, request, encoder, data, chunk_size, cooperator=None):
+        self.request = request
+        self.encoder = encoder
+        self.data = data
+        self.chunk_size = chunk_size
+        self.cooperator = cooperator or task
+
+    def start(self):
+        """Returns a deferred firing with True once the whole response is written, False when
+        it has been interrupted and the connection lost or closed"""
+        self.task = self.cooperator.cooperate(self._write())
+        self.request.registerProducer(self, True)
+        self.request.notifyFinish().addErrback(lambda failure: self.stopProducing())
+        return self.task.whenDone().addCallbacks(self._done, self._failed)
+
+    def _write(self):
+        chunks = []
+        size = 0
+        for chunk in self.encoder.iterencode(self.data):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= self.chunk_size:
+                self.request.write(''.join(chunks))
+                chunks = []
+                size = 0
+                yield
+        self.request.write(''.join(chunks))
+
+    def _done(self, result):
+        self.request.unregisterProducer()
+        return True
+
+    def _failed(self, failure):
+        self.request.unregisterProducer()
+        if failure.check(task.TaskStopped):
+            return False
+
+        # with nothing written the error can still be reported with a proper status
+        if not self.request.startedWriting:
+            return failure
+        log.err(failure, system='httprest')
+        # otherwise the incomplete response cannot be mistaken for a complete one
+        self.request.transport.loseConnection()
+        return False
+
+    def pauseProducing(self):
+        self.task.pause()
+
+    def resumeProducing(self):
+        try:
+            self.task.resume()
+        except task.NotPaused:
+            pass
+
+    def stopProducing(self):
+        try:
+            self.task.stop()
+        except task.TaskFinished:
+            pass
+
+
 def log_wrapper(self, f, server):
     @functools.wraps(f)
     def log_(request):
@@ -139,6 +211,8 @@ class HttpRestServer(resource.Resource):
 
         self.use_security_proxy = get_config().getboolean('auth', 'security_proxy_rest')
         self.use_keystone_tokens = get_config().getboolean('auth', 'use_keystone', False)
+        self.stream_threshold = get_config().getint('rest', 'stream_threshold', 100)
+        self.stream_chunk_size = get_config().getint('rest', 'stream_chunk_size', 65536)
 
     def render(self, request):
         request.site.log = log_wrapper(request.site, request.site.log, self)
@@ -168,9 +242,16 @@ class HttpRestServer(resource.Resource):
             # allow views to take full control of output streaming
             if ret is not NOT_DONE_YET and ret is not EmptyResponse:
                 request.setHeader('Content-Type', 'application/json')
-                json_data = json.dumps(ret, indent=2, cls=JsonSetEncoder)
-                request.setHeader('Content-Length', intToBytes(len(json_data)))
-                request.write(json_data)
+                encoder = self.get_encoder(request)
+                if self.is_streamed(ret):
+                    # without a Content-Length the response is sent with chunked transfer encoding
+                    if not (yield JsonProducer(request, encoder, ret, self.stream_chunk_size).start()):
+                        ret = NOT_DONE_YET
+                else:
+                    # `iterencode` doesn't use the C encoder, which cannot handle the security proxies
+                    json_data = ''.join(encoder.iterencode(ret))
+                    request.setHeader('Content-Length', intToBytes(len(json_data)))
+                    request.write(json_data)
         except HttpStatus as exc:
             request.setResponseCode(exc.status_code, exc.status_description)
             for name, value in exc.headers.items():
@@ -193,6 +274,18 @@ class HttpRestServer(resource.Resource):
             if ret is not NOT_DONE_YET:
                 request.finish()
 
+    def get_encoder(self, request):
+        """Indented JSON, unless requested with 'compact=true'"""
+        if request.args.get('compact', ['false'])[0] == 'true':
+            return JsonSetEncoder(separators=(',', ':'))
+        return JsonSetEncoder(indent=2)
+
+    def is_streamed(self, data):
+        """Listings of many children are streamed, instead of being encoded at once"""
+        if isinstance(data, dict):
+            data = data.get('children')
+        return isinstance(data, (list, tuple)) and len(data) >= self.stream_threshold
+
     def check_auth(self, request):
         from opennode.oms.endpoint.httprest.auth import IHttpRestAuthenticationUtility, ISessionStorage
 
@@ -219,11 +312,49 @@ class HttpRestServer(resource.Resource):
             raise NotFound
         return subview
 
-    @db.transact
     def handle_request(self, request):
         """Takes a request, maps it to a domain object and a corresponding IHttpRestView
-        and returns the rendered output of that view.
+        and returns (a deferred with) the rendered output of that view.
+
+        GET requests are served within a read-only transaction, unless their view requires
+        a read-write one (see `IHttpRestView.rw_transaction`).
+        """
+        if request.method == 'GET':
+            return self.handle_ro_request(request)
+        return self.handle_rw_request(request)
+
+    @defer.inlineCallbacks
+    def handle_ro_request(self, request):
+        needs_rw_transaction, res = yield self._handle_ro_request(request)
+        if needs_rw_transaction:
+            res = yield self.handle_rw_request(request)
+        elif isinstance(res, defer.Deferred):
+            # the transaction is already gone, views returning deferreds on GET
+            # shouldn't access the db after the deferred fires
+            res = yield res
+        defer.returnValue(res)
+
+    @db.ro_transact(snapshot=True, priority='interactive')
+    def _handle_ro_request(self, request):
+        view, needs_rw_transaction = self.resolve_view(request)
+        if needs_rw_transaction:
+            return True, None
+        return False, self.render_view(view, request)
+
+    @db.async_transact(priority='interactive')
+    def handle_rw_request(self, request):
+        """Views can return a deferred, the transaction will be committed when it fires
+        without keeping a db thread busy in the meantime.
         """
+        view, needs_rw_transaction = self.resolve_view(request)
+
+        res = self.render_view(view, request)
+        if isinstance(res, defer.Deferred):
+            res = yield res
+        defer.returnValue(res if needs_rw_transaction else db.RollbackValue(res))
+
+    def resolve_view(self, request):
+        """Returns the (security proxied) view for the request and whether it needs a read-write transaction"""
         principal = self.check_auth(request)
 
         oms_root = db.get_root()['oms_root']
@@ -254,6 +385,9 @@ class HttpRestServer(resource.Resource):
                 # on how to secure a view
                 pass
 
+        return view, needs_rw_transaction
+
+    def render_view(self, view, request):
         def get_renderer(view, method):
             try:
                 return getattr(view, method, None)
@@ -267,10 +401,8 @@ class HttpRestServer(resource.Resource):
             if renderer:
                 from opennode.oms.endpoint.httprest.auth import AuthView
                 if isinstance(view, AuthView) and renderer.__name__ == 'render':
-                    res = renderer(request, self.use_keystone_tokens)
-                else:
-                    res = renderer(request)
-                return res if needs_rw_transaction else db.RollbackValue(res)
+                    return renderer(request, self.use_keystone_tokens)
+                return renderer(request)
 
         raise NotImplementedError("Method %s is not implemented in %s\n" % (request.method, view))
 
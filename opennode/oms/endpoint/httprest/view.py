@@ -4,8 +4,9 @@ import time
 import traceback
 import Queue
 
-from grokcore.component import context
+from grokcore.component import context, name
 from hashlib import sha1
+from itertools import ifilter, islice
 from twisted.web.server import NOT_DONE_YET
 from twisted.python import log
 from twisted.internet import reactor, threads, defer
@@ -20,7 +21,7 @@ from opennode.oms.endpoint.ssh.detached import DetachedProtocol
 from opennode.oms.endpoint.ssh.cmdline import ArgumentParsingError
 from opennode.oms.model.form import RawDataApplier
 from opennode.oms.model.location import ILocation
-from opennode.oms.model.model.base import IContainer
+from opennode.oms.model.model.base import IContainer, Container
 from opennode.oms.model.model.bin import ICommand
 from opennode.oms.model.model.byname import ByNameContainer
 from opennode.oms.model.model.events import ModelDeletedEvent
@@ -32,6 +33,8 @@ from opennode.oms.model.schema import model_to_dict
 from opennode.oms.model.traversal import traverse_path
 from opennode.oms.security.checker import get_interaction
 from opennode.oms.zodb import db
+from opennode.oms.zodb.profiler import profiler
+from opennode.oms.zodb.stats import DbStats
 
 
 class DefaultView(HttpRestView):
@@ -41,17 +44,24 @@ class DefaultView(HttpRestView):
         if not request.interaction.checkPermission('view', self.context):
             raise NotFound
 
-        data = model_to_dict(self.context)
+        # only the attributes requested with `attrs` are computed,
+        # blobs can be big, they are rendered only when explicitly requested
+        attrs = self.requested_attributes(request)
+        data = model_to_dict(self.context, blobs=attrs or (), attrs=attrs, ordered=False)
 
         data['id'] = self.context.__name__
-        data['__type__'] = type(removeSecurityProxy(self.context)).__name__
-        try:
-            data['url'] = ILocation(self.context).get_url()
-        except Unauthorized:
-            data['url'] = ''
+        if attrs is None or '__type__' in attrs:
+            data['__type__'] = type(removeSecurityProxy(self.context)).__name__
+
+        if attrs is None or 'url' in attrs:
+            try:
+                data['url'] = ILocation(self.context).get_url()
+            except Unauthorized:
+                data['url'] = ''
 
-        interaction = get_interaction(self.context)
-        data['permissions'] = effective_perms(interaction, self.context) if interaction else []
+        if attrs is None or 'permissions' in attrs:
+            interaction = get_interaction(self.context)
+            data['permissions'] = effective_perms(interaction, self.context) if interaction else []
 
         # XXX: simplejson can't serialize sets
         if 'tags' in data:
@@ -107,25 +117,39 @@ class ContainerView(DefaultView):
         return self.render_recursive(request, depth, top_level=True)
 
     def render_recursive(self, request, depth, filter_=[], top_level=False):
+        """Renders the container and, up to `depth`, its children.
+
+        Top level children can be filtered (`q`), sorted (`sort`, `-` prefixed for descending order)
+        and paged either with `offset`/`limit` or with `after`/`limit`, where `after` is the name of
+        the last child of the previous page (see `next`). Offset pages come with `totalChildren`
+        which, unless filtering or sorting, is the number of stored children (see
+        `IContainer.__len__`) regardless of the permissions; cursor pages have no `totalChildren`.
+        """
         container_properties = super(ContainerView, self).render_GET(request)
 
+        attrs = self.requested_attributes(request)
+        # stored children, regardless of the permissions; containers without a children counter
+        # count their whole content, which is done only when asked for
+        if ('count' in attrs if attrs is not None else
+                isinstance(removeSecurityProxy(self.context), Container)):
+            container_properties['count'] = len(self.context)
+
         if depth < 1:
             return self.filter_attributes(request, container_properties)
 
         exclude = [excluded.strip() for excluded in request.args.get('exclude', [''])[0].split(',')]
 
         def preconditions(obj):
+            # cheapest first, `all` stops at the first failing one
+            yield obj.__name__ not in exclude
             try:
                 yield request.interaction.checkPermission('view', obj)
             except Exception as e:
                 log.msg('Error accessing %s to check view permission' % obj)
                 log.err(e)
                 yield
-            yield obj.__name__ not in exclude
             yield obj.target.__parent__ == obj.__parent__ if type(obj) is Symlink else True
 
-        items = map(follow_symlinks, filter(lambda obj: all(preconditions(obj)), self.context.listcontent()))
-
         def secure_render_recursive(item):
             try:
                 return IHttpRestView(item).render_recursive(request, depth - 1)
@@ -138,6 +162,8 @@ class ContainerView(DefaultView):
         qlist = []
         limit = None
         offset = 0
+        sort = ''
+        after = None
 
         if top_level:
             qlist = request.args.get('q', [])
@@ -146,6 +172,12 @@ class ContainerView(DefaultView):
             offset = int(request.args.get('offset', [1])[0]) - 1
             if offset <= 0:
                 offset = 0
+            sort = request.args.get('sort', [''])[0]
+            after = request.args.get('after', [None])[0]
+            if after is not None:
+                after = after.decode('utf-8')
+                if sort not in ('', 'name') or offset:
+                    raise BadRequest("'after' can be used only with the default ordering by name, without 'offset'")
 
         def secure_filter_match(item, q):
             try:
@@ -153,20 +185,49 @@ class ContainerView(DefaultView):
             except Unauthorized:
                 return
 
+        def sort_key(entry):
+            key = sort.lstrip('-')
+            if key == 'name':
+                return entry[0]
+            return model_to_dict(entry[1], attrs=[key], ordered=False).get(key)
+
+        # children are filtered (and sorted) before rendering, only the requested page is rendered
+        entries = ((obj.__name__, follow_symlinks(obj)) for obj in self.context.itercontent(after)
+                   if all(preconditions(obj)))
         for q in qlist:
-            items = filter(lambda item: secure_filter_match(item, q), items)
+            entries = ifilter(lambda entry, q=q: secure_filter_match(entry[1], q), entries)
+        entries = ifilter(lambda entry: queryAdapter(entry[1], IHttpRestView) and not self.blacklisted(entry[1]),
+                          entries)
+        if sort not in ('', 'name'):
+            entries = sorted(entries, key=sort_key, reverse=sort.startswith('-'))
+
+        if after is not None:
+            # cursor paging: the walk over the children stops once the page is full
+            page = list(islice(entries, limit + 1 if limit else None))
+            more = limit and len(page) > limit
+            page = page[:limit] if limit else page
+            container_properties['children'] = filter(None, [secure_render_recursive(item) for _, item in page])
+            container_properties['next'] = page[-1][0] if more else None
+            return self.filter_attributes(request, container_properties)
 
-        children = filter(None, [secure_render_recursive(item) for item in items
-                                 if queryAdapter(item, IHttpRestView) and not self.blacklisted(item)])
+        if (limit or offset) and not qlist and sort in ('', 'name'):
+            # only the children up to the end of the page are walked
+            entries = list(islice(entries, offset, offset + limit if limit else None))
+            total_children = len(self.context)
+        else:
+            entries = list(entries)
+            total_children = len(entries)
 
-        total_children = len(children)
+            if limit or offset:
+                entries = entries[offset:offset + limit] if limit else entries[offset:]
 
-        if (limit is not None and limit != 0) or offset:
-            children = children[offset : offset + limit]
+        children = filter(None, [secure_render_recursive(item) for _, item in entries])
 
         # backward compatibility:
         # top level results for pure containers are plain lists
-        if top_level and (not container_properties or len(container_properties.keys()) == 1):
+        # (with `attrs` the container properties have been rendered only partially)
+        if top_level and (not container_properties or (len(container_properties.keys()) == 1 and
+                                                       self.requested_attributes(request) is None)):
             return children
 
         if not top_level or depth > 0:
@@ -238,6 +299,24 @@ class StreamView(HttpRestView):
         return [timestamp, dict(res)]
 
 
+class TransactionProfileView(HttpRestView):
+    """Dumps the whole transaction profile (including histograms) in one request:
+
+        GET /proc/db/profile
+    """
+    context(DbStats)
+    name('profile')
+
+    def rw_transaction(self, request):
+        return False
+
+    def render_GET(self, request):
+        if not request.interaction.checkPermission('view', self.context):
+            raise NotFound
+
+        return profiler.report()
+
+
 class CommandView(DefaultView):
     context(ICommand)
 
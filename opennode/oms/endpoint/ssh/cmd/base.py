@@ -1,4 +1,4 @@
-from grokcore.component import Subscription, implements, context, queryOrderedSubscriptions
+from grokcore.component import Subscription, implements, context
 from twisted.internet import defer, reactor
 from twisted.python.threadable import isInIOThread
 from zope.component import queryAdapter
@@ -9,12 +9,16 @@ from opennode.oms.endpoint.ssh.cmdline import (ICmdArgumentsSyntax, IContextualC
 from opennode.oms.model.model.proc import Proc
 from opennode.oms.model.traversal import traverse_path
 from opennode.oms.security.checker import proxy_factory
+from opennode.oms.util import query_subscriptions
 from opennode.oms.zodb import db, proxy
 from opennode.oms.zodb.extractors import IContextExtractor
 
 
 class Cmd(object):
 
+    # arguments already parsed while computing the subject, see `subject_from_raw`
+    parsed_args = None
+
     def __init__(self, protocol):
         self.protocol = protocol
         self.terminal = protocol.terminal
@@ -23,7 +27,9 @@ class Cmd(object):
     @defer.inlineCallbacks
     def __call__(self, *args):
         """Subclasses should override this if they need raw arguments."""
-        parsed = yield defer.maybeDeferred(self.parse_args, args)
+        parsed = self.parsed_args
+        if parsed is None:
+            parsed = yield defer.maybeDeferred(self.parse_args, args)
         yield self.execute(parsed)
 
     def execute(args):
@@ -43,7 +49,7 @@ class Cmd(object):
 
     @defer.inlineCallbacks
     def _parent_parsers(self):
-        parser_confs = queryOrderedSubscriptions(self, ICmdArgumentsSyntax)
+        parser_confs = query_subscriptions(self, ICmdArgumentsSyntax, ordered=True)
         if ICmdArgumentsSyntax.providedBy(self):
             parser_confs.append(self)
 
@@ -148,12 +154,17 @@ class Cmd(object):
     def subject_from_raw(self, args):
         """Subclasses should override this if they need raw arguments."""
         parsed = yield defer.maybeDeferred(self.parse_args, args)
+        self.parsed_args = parsed
         subject = yield defer.maybeDeferred(self.subject, parsed)
         defer.returnValue(subject)
 
     @defer.inlineCallbacks
-    def register(self, d, args, command_line, ptid=None):
-        subj = yield defer.maybeDeferred(self.subject_from_raw, args)
+    def register(self, d, args, command_line, ptid=None, subject=None):
+        """Registers the command in /proc. `subject` can be passed (even as a deferred) if it
+        has already been computed, e.g. with `subject_from_raw`."""
+        if subject is None:
+            subject = defer.maybeDeferred(self.subject_from_raw, args)
+        subj = yield subject
 
         # XXX: for some reason, when I let subject to be a generator instance, I get an empty
         # generator in the ComputeTasks container, while it magically works when I save it as a tuple
@@ -31,9 +31,8 @@ from opennode.oms.model.model.events import ModelDeletedEvent
 from opennode.oms.model.model.hooks import PreValidateHookMixin
 from opennode.oms.model.model.proc import Proc
 from opennode.oms.model.model.symlink import Symlink, follow_symlinks
-from opennode.oms.model.schema import Path, get_schema_fields, model_to_dict
+from opennode.oms.model.schema import Path, get_descriptor, get_schema_fields, model_to_dict
 from opennode.oms.model.traversal import canonical_path
-from opennode.oms.util import blocking_yield
 from opennode.oms.zodb import db
 
 
@@ -308,9 +307,9 @@ class CatObjectCmd(Cmd):
     def _do_cat(self, obj, attrs, filename=None):
         name = '%s: ' % filename if filename else ''
 
-        data = [(key, value, name + title)
-                for (key, value), title
-                in zip(model_to_dict(obj).items(), model_to_dict(obj, use_titles=True).keys())
+        titles = get_descriptor(obj).titles
+        data = [(key, value, name + titles.get(key, key))
+                for key, value in model_to_dict(obj, blobs=attrs or True).items()
                 if key in attrs or not attrs]
 
         log.msg('data: %s' % data, system='cat-cmd')
@@ -511,7 +510,7 @@ class CreateObjCmd(Cmd):
         parser.add_argument('type', choices=choices, help="object type to be created")
         return parser
 
-    @db.transact
+    @db.async_transact
     def execute(self, args):
         model_cls = creatable_models.get(args.type)
 
@@ -526,7 +525,7 @@ class CreateObjCmd(Cmd):
 
         vh = PreValidateHookMixin(obj)
         try:
-            blocking_yield(vh.validate_hook(self.protocol.principal))
+            yield vh.validate_hook(self.protocol.principal)
         except Exception:
             msg = 'Cancelled executing "%s" due to validate_hook failure' % self.name
             self.write('%s\n' % msg)
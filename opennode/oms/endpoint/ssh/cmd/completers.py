@@ -55,7 +55,7 @@ class PathCompleter(PositionalCompleter):
     """Completes a path name."""
     baseclass()
 
-    @db.ro_transact
+    @db.ro_transact(priority='interactive')
     def complete(self, token, parsed, parser, **kwargs):
         # If there is still any positional option to complete:
         if self.expected_action(parsed, parser):
@@ -96,7 +96,7 @@ class CommandCompleter(PathCompleter):
                            list(cmds) + list(set(paths).difference(i + '*' for i in cmds))
                            if value.startswith(token)])
 
-    @db.ro_transact
+    @db.ro_transact(priority='interactive')
     def _scan_search_path(self, protocol):
         dummy = commands.NoCommand(protocol)
 
@@ -1,7 +1,9 @@
-from grokcore.component import Subscription, implements, baseclass, querySubscriptions
+from grokcore.component import Subscription, implements, baseclass
 from twisted.internet import defer
 from zope.interface import Interface
 
+from opennode.oms.util import query_subscriptions
+
 
 class ICompleter(Interface):
     def complete(token, parsed_args, parser, **kwargs):
@@ -39,7 +41,7 @@ def complete(protocol, buf, pos, **kwargs):
     if partial.startswith('"'):
         partial = partial[1:]
 
-    completers = querySubscriptions(context, ICompleter)
+    completers = query_subscriptions(context, ICompleter)
 
     all_completions = []
     for completer in completers:
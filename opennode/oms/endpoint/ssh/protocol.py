@@ -9,6 +9,7 @@ from grokcore.component import Subscription, implements, context
 from twisted.conch.insults.insults import ServerProtocol
 from twisted.internet import defer
 from twisted.python import log
+from zope.component import getGlobalSiteManager
 from zope.security.interfaces import ForbiddenAttribute, Unauthorized
 
 from opennode.oms.config import get_config
@@ -18,7 +19,7 @@ from opennode.oms.endpoint.ssh.colored_columnize import columnize
 from opennode.oms.endpoint.ssh.terminal import InteractiveTerminal, BLUE, CYAN, GREEN, CTRL_C
 from opennode.oms.endpoint.ssh.tokenizer import CommandLineTokenizer, CommandLineSyntaxError
 from opennode.oms.model.model.base import IContainer
-from opennode.oms.model.model.bin import ICommand
+from opennode.oms.model.model.bin import Bin, ICommand
 from opennode.oms.model.model.proc import Proc
 from opennode.oms.security.interaction import new_interaction
 from opennode.oms.zodb import db
@@ -76,6 +77,9 @@ class OmsShellProtocol(InteractiveTerminal):
         self.path = ['']
         self.last_error = None
         self.environment = {'PATH': '.:./actions:/bin'}
+        # {absolute command path: command class}, see `_lookup_command_class`
+        self.command_classes = {}
+        self.command_classes_generation = None
         self.path_stack = []
         self.sub_protocol = None
         self.principal = None
@@ -140,7 +144,7 @@ class OmsShellProtocol(InteractiveTerminal):
     def spawn_command(self, line):
         line = line.strip()
         try:
-            command, cmd_args = yield self.parse_line(line)
+            command, cmd_args, subject = yield self.prepare_command(line)
         except CommandLineSyntaxError as e:
             self.terminal.write("Syntax error: %s\n" % (e.message))
             self.print_prompt()
@@ -153,7 +157,7 @@ class OmsShellProtocol(InteractiveTerminal):
         try:
             self.sub_protocol = CommandExecutionSubProtocol(self)
             deferred = defer.Deferred()
-            yield command.register(deferred, cmd_args, line, self.tid)
+            yield command.register(deferred, cmd_args, line, self.tid, subject=subject)
 
             cmdd = defer.maybeDeferred(command, *cmd_args)
             cmdd.chainDeferred(deferred)
@@ -190,14 +194,27 @@ class OmsShellProtocol(InteractiveTerminal):
                 if key not in self.keyHandlers.keys():
                     self.keystrokeReceived(key, mod)
 
-    @db.ro_transact
-    def parse_line(self, line):
-        """Returns a command instance and parsed cmdline argument list.
+    @db.ro_transact(priority='interactive')
+    def prepare_command(self, line):
+        """Returns a command instance, the parsed cmdline argument list and a deferred subject.
 
-        TODO: Shell expansion should be handled here.
+        Resolving the command, parsing its arguments and computing its subject only read, they
+        happen in a single read-only transaction: the `ro_transact` functions they call run in it
+        instead of hopping to other threads. Commands which write open their own read-write
+        transactions when executed. Errors computing the subject are delivered through the
+        subject deferred.
 
         """
+        command, cmd_args = self._parse_line(line)
+        return command, cmd_args, command.subject_from_raw(cmd_args)
+
+    @db.ro_transact(priority='interactive')
+    def parse_line(self, line):
+        """Returns a command instance and parsed cmdline argument list."""
+        return self._parse_line(line)
 
+    def _parse_line(self, line):
+        # TODO: Shell expansion should be handled here.
         cmd_name, cmd_args = line.partition(' ')[::2]
         command_cls = self.get_command_class(cmd_name)
         command = command_cls(self)
@@ -207,14 +224,30 @@ class OmsShellProtocol(InteractiveTerminal):
         return command, tokenized_cmd_args
 
     def get_command_class(self, name):
+        # the cached commands are those of /bin, which change only when commands or components
+        # are (un)registered, e.g. when grokking plugins
+        generation = (getGlobalSiteManager().adapters._generation, len(registry.commands()))
+        if generation != self.command_classes_generation:
+            self.command_classes = {}
+            self.command_classes_generation = generation
+
+        return self._lookup_command_class(name) or registry.get_command(name)
+
+    def _lookup_command_class(self, name):
         # NOTE: used to leverage the 'traverse()' method which takes into consideration
         # path handling quirks for relative paths
         dummy = commands.NoCommand(self)
         for d in self.environment['PATH'].split(':'):
             effective_dir = name if os.path.isabs(name) else os.path.join(d, name)
+            if effective_dir in self.command_classes:
+                return self.command_classes[effective_dir]
             try:
                 command = dummy.traverse(effective_dir)
                 if ICommand.providedBy(command):
+                    # other commands (e.g. actions) depend on the database content, and
+                    # unknown names aren't cached so that typos don't fill the cache
+                    if os.path.isabs(effective_dir) and isinstance(command.__parent__, Bin):
+                        self.command_classes[effective_dir] = command.cmd
                     return command.cmd
             except ForbiddenAttribute:
                 pass
@@ -222,9 +255,6 @@ class OmsShellProtocol(InteractiveTerminal):
                 # skip command paths where we don't have access
                 pass
 
-        # NOTE: retained temporarily because it contains inner class
-        return registry.get_command(name)
-
     def expand(self, command, tokens):
         return list(itertools.chain.from_iterable([self.expand_token(command, i) for i in tokens]))
 
@@ -196,7 +196,7 @@ class UserEventLogZODBHandler(logging.Handler):
         assert hasattr(record, 'asctime'), str(record)
         self.queue.put(record)
 
-        @db.transact
+        @db.transact(pool='background')
         def flush():
             eventlog = db.get_root()['oms_root']['eventlog']
             try:
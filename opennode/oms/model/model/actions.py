@@ -1,11 +1,12 @@
 from __future__ import absolute_import
 
 import martian
-from grokcore.component import Subscription, baseclass, querySubscriptions
+from grokcore.component import Subscription, baseclass
 from zope.interface import implements
 
 from .base import IContainerExtender, ReadonlyContainer
 from .bin import ICommand, Command
+from opennode.oms.util import query_subscriptions
 
 
 class ActionsContainer(ReadonlyContainer):
@@ -18,7 +19,7 @@ class ActionsContainer(ReadonlyContainer):
         self.__parent__ = parent
 
     def content(self):
-        actions = querySubscriptions(self.__parent__, ICommand)
+        actions = query_subscriptions(self.__parent__, ICommand)
         return dict((action._name, Command(action._name, self, action.cmd)) for action in actions
                     if any(i.providedBy(action) for i in getattr(action, '__interfaces__', [])) or
                     not getattr(action, '__interfaces__', []))
@@ -28,6 +29,8 @@ class ActionsContainerExtension(Subscription):
     implements(IContainerExtender)
     baseclass()
 
+    names = ('actions', )
+
     def extend(self):
         return {'actions': ActionsContainer(self.context)}
 
@@ -1,10 +1,13 @@
 import persistent
 import time
 import logging
+from bisect import bisect_right
+from heapq import merge
 from uuid import uuid4
 
+from BTrees.Length import Length
 from BTrees.OOBTree import OOBTree
-from grokcore.component import Subscription, querySubscriptions, baseclass
+from grokcore.component import Subscription, baseclass
 from zope import schema
 from zope.annotation.interfaces import IAttributeAnnotatable
 from zope.interface import alsoProvides, noLongerProvides
@@ -16,9 +19,11 @@ from zope.security.proxy import removeSecurityProxy
 from zope.securitypolicy import interfaces
 
 from opennode.oms.security.directives import permissions
-from opennode.oms.util import get_direct_interfaces, exception_logger
+from opennode.oms.util import exception_logger, query_subscriptions
 from opennode.oms.model.form import TmpObj
+from opennode.oms.model.schema import get_descriptor
 from opennode.oms.model.model.events import ModelCreatedEvent, ModelMovedEvent, OwnerChangedEvent
+from opennode.oms.zodb.merge import merge_states, merge_max, merge_set_union
 from zope.component import handle
 
 
@@ -48,9 +53,16 @@ class IContainer(IModel):
     def listcontent():
         """Lists all the items contained in this container."""
 
+    def itercontent(after=None):
+        """Iterates over the items in this container ordered by name, starting after the `after` name."""
+
     def __iter__():
         """Returns an iterator over the items in this container."""
 
+    def __len__():
+        """Returns the number of items stored in this container, extensions excluded. Containers
+        computing their own content return the number of items in it, which can be expensive."""
+
 
 class IDisplayName(Interface):
     def display_name():
@@ -114,6 +126,11 @@ class Model(persistent.Persistent):
     _mtime = None
     _mtime_blacklist = ('inherit_permissions', 'owner', 'features', 'oid', 'metadata')
 
+    # Merge policies used by conflict resolution for attributes changed by both transactions,
+    # see opennode.oms.zodb.merge. Subclasses declare only their own attributes, they are
+    # combined with those of the base classes.
+    _merge_policies = dict(_mtime=merge_max, _tags=merge_set_union)
+
     def __init__(self, *args, **kwargs):
         self._ctime = self._mtime = time.time()
         super(Model, self).__init__(self, *args, **kwargs)
@@ -130,9 +147,17 @@ class Model(persistent.Persistent):
             self._mtime = time.time()
         return self._mtime
 
+    @classmethod
+    def get_merge_policies(cls):
+        policies = {}
+        for base in reversed(cls.__mro__):
+            policies.update(base.__dict__.get('_merge_policies', {}))
+        return policies
+
     def _p_resolveConflict(self, oldState, savedState, newState):
-        logger.debug('Resolve conflict: %s -> %s -> %s, choosing last', oldState, savedState, newState)
-        return newState
+        # `self` is a ghost created only for resolving the conflict, it has no state
+        logger.debug('Resolve conflict: %s -> %s -> %s', oldState, savedState, newState)
+        return merge_states(oldState, savedState, newState, type(self).get_merge_policies())
 
     def set_inherit_permissions(self, value):
         self._inherit_permissions = value
@@ -163,17 +188,17 @@ class Model(persistent.Persistent):
 
     @classmethod
     def class_implemented_interfaces(cls):
-        return get_direct_interfaces(cls)
+        return list(get_descriptor(cls).direct_interfaces)
 
     def implemented_interfaces(self):
         return self.class_implemented_interfaces() + list(directlyProvidedBy(self).interfaces())
 
     @classmethod
     def get_class_features(cls):
-        return set([i.__name__ for i in cls.class_implemented_interfaces()])
+        return set(get_descriptor(cls).features)
 
     def get_features(self):
-        return set([i.__name__ for i in self.implemented_interfaces()])
+        return set(get_descriptor(self).features)
 
     def set_features(self, values):
         """
@@ -221,6 +246,9 @@ class Model(persistent.Persistent):
 
 
 class IContainerExtender(Interface):
+    names = Attribute("Optional, names of the elements returned by `extend`. Allows resolving "
+                      "a single child without calling the other extenders")
+
     def extend(self):
         """Extend the container contents with new elements."""
 
@@ -237,6 +265,10 @@ class ContainerExtension(Subscription):
     __class__ = None
     __interfaces__ = ()
 
+    @property
+    def names(self):
+        return (self.__class__.__dict__.get('__name__'), )
+
     def extend(self):
         # XXX: currently models designed for container extension expect the parent
         # as constructor argument, but it's not needed anymore
@@ -263,7 +295,9 @@ class ReadonlyContainer(Model):
     implements(IContainer)
     permissions(dict(listnames='traverse',
                      listcontent='traverse',
+                     itercontent='traverse',
                      __iter__='traverse',
+                     __len__='traverse',
                      __getitem__='traverse',
                      can_contain='add',
                      content='traverse',
@@ -271,7 +305,16 @@ class ReadonlyContainer(Model):
                      ))
 
     def __getitem__(self, key):
-        return self.content().get(key)
+        # containers computing their own content have to be listed
+        if type(self).content.im_func is not ReadonlyContainer.content.im_func:
+            return self.content().get(key)
+
+        item = self._items.get(key)
+        if item is None and self._inject():
+            item = self._items.get(key)
+        if item is None:
+            item = self._extension(key)
+        return item
 
     def listnames(self):
         return self.content().keys()
@@ -282,38 +325,97 @@ class ReadonlyContainer(Model):
     def __iter__(self):
         return iter(self.listcontent())
 
+    def __len__(self):
+        if type(self).content.im_func is not ReadonlyContainer.content.im_func:
+            return len(self.content())
+        return len(self._items)
+
+    def __nonzero__(self):
+        # containers are true even when empty, as any other model
+        return True
+
+    def itercontent(self, after=None):
+        """Stored children are read from a key range of the OOBTree without building the whole
+        content; containers computing their own content sort it."""
+        if (type(self).content.im_func is not ReadonlyContainer.content.im_func or
+                not isinstance(self._items, OOBTree)):
+            content = self.content()
+            names = sorted(content)
+            if after is not None:
+                names = names[bisect_right(names, after):]
+            return (content[name] for name in names)
+
+        self._inject()
+        extensions = {}
+        for extender in query_subscriptions(self, IContainerExtender):
+            if self._applies(extender):
+                extensions.update(self._extend(extender))
+
+        # the range is copied: iterating over the buckets while the caller loads the children
+        # isn't safe, the BTree could be deactivated in between
+        stored = self._items.items(after, excludemin=True) if after is not None else self._items.items()
+        # the stored children take precedence over the extensions, as in `content` and `__getitem__`
+        extended = sorted((k, v) for k, v in extensions.items()
+                          if (after is None or k > after) and k not in self._items)
+        return (v for k, v in merge(stored, extended))
+
     def can_contain(self, item):
         """A read only container cannot accept new children"""
         return False
 
-    @exception_logger
-    def content(self):
-        injectors = querySubscriptions(self, IContainerInjector)
-        for injector in injectors:
-            interface_filter = getattr(injector, '__interfaces__', [])
-            if interface_filter and not any(map(lambda i: i.providedBy(self), interface_filter)):
+    def _applies(self, subscription):
+        interface_filter = getattr(subscription, '__interfaces__', [])
+        return not interface_filter or any(i.providedBy(self) for i in interface_filter)
+
+    def _inject(self):
+        """Persists the missing injected models, returns True if some was added"""
+        added = False
+        for injector in query_subscriptions(self, IContainerInjector):
+            if not self._applies(injector):
                 continue
 
             for k, v in injector.inject().items():
                 if k not in self._items:
                     v.__parent__ = self
                     self._items[k] = v
+                    self._update_count(1)
+                    added = True
+        return added
+
+    def _update_count(self, delta):
+        """Called after `delta` items have been added to (or removed from) the stored ones"""
+
+    def _extend(self, extender):
+        children = extender.extend()
+        for v in children.values():
+            v.__parent__ = self
+            v.__transient__ = True
+            v.inherit_permissions = True
+        return children
+
+    def _extension(self, key):
+        """Returns the extension named `key`, only the extenders which may provide it are called"""
+        for extender in query_subscriptions(self, IContainerExtender):
+            names = getattr(extender, 'names', None)
+            if names is not None and key not in names or not self._applies(extender):
+                continue
 
-        items = dict(**self._items)
+            children = self._extend(extender)
+            if key in children:
+                return children[key]
 
-        extenders = querySubscriptions(self, IContainerExtender)
-        for extender in extenders:
-            interface_filter = getattr(extender, '__interfaces__', [])
-            if interface_filter and not any(map(lambda i: i.providedBy(self), interface_filter)):
-                continue
+    @exception_logger
+    def content(self):
+        self._inject()
+
+        items = {}
 
-            children = extender.extend()
-            for v in children.values():
-                v.__parent__ = self
-                v.__transient__ = True
-                v.inherit_permissions = True
-            items.update(children)
+        for extender in query_subscriptions(self, IContainerExtender):
+            if self._applies(extender):
+                items.update(self._extend(extender))
 
+        # the stored children take precedence over the extensions
+        items.update(self._items)
         return items
 
     _items = {}
@@ -357,9 +459,17 @@ class AddingContainer(ReadonlyContainer):
         return res
 
     def rename(self, old_name, new_name):
+        from opennode.oms.model.pathcache import invalidate
+        if old_name == new_name:
+            return
+        invalidate(self._items[old_name])
+
+        replaced = new_name in self._items
         self._items[new_name] = self._items[old_name]
         del self._items[old_name]
         self._items[new_name].__name__ = new_name
+        if replaced:
+            self._update_count(-1)
 
 
 class Container(AddingContainer):
@@ -372,8 +482,25 @@ class Container(AddingContainer):
 
     __contains__ = Interface
 
+    # containers created before the counters were introduced get theirs on the first change,
+    # see `count_children`
+    _count = None
+
     def __init__(self):
         self._items = OOBTree()
+        self._count = Length()
+
+    def __len__(self):
+        """The children aren't loaded, the count is kept in a conflict resolving `Length`"""
+        if self._count is None:
+            return len(self._items)
+        return self._count()
+
+    def _update_count(self, delta):
+        if self._count is None:
+            self._count = Length(len(self._items))
+        else:
+            self._count.change(delta)
 
     def _add(self, item):
         item = removeSecurityProxy(item)
@@ -387,13 +514,37 @@ class Container(AddingContainer):
         if not id:
             id = self._new_id()
 
+        added = id not in self._items
         self._items[id] = item
         item.__name__ = id
+        if added:
+            self._update_count(1)
 
         return id
 
     def remove(self, item):
-        del self._items[item.__name__]
+        del self[item.__name__]
 
     def __delitem__(self, key):
         del self._items[key]
+        self._update_count(-1)
+
+
+def count_children(root):
+    """Adds the children counters to the containers found under `root` which were created before
+    they were introduced. Returns the number of updated containers.
+
+    """
+    updated = 0
+    containers = [root]
+    while containers:
+        container = containers.pop()
+        # computed content, e.g. search results
+        if isinstance(getattr(type(container), '_items', None), property):
+            continue
+
+        if isinstance(container, Container) and container._count is None:
+            container._count = Length(len(container._items))
+            updated += 1
+        containers.extend(i for i in container._items.values() if isinstance(i, ReadonlyContainer))
+    return updated
@@ -37,5 +37,7 @@ class ByNameContainerExtension(Subscription):
     implements(IContainerExtender)
     baseclass()
 
+    names = ('by-name', )
+
     def extend(self):
         return {'by-name': ByNameContainer(self.context)}
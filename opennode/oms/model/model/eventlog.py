@@ -1,6 +1,5 @@
 from __future__ import absolute_import
 
-from BTrees.OOBTree import OOBTree
 from grokcore.component import context
 from zope import schema
 from zope.interface import implements, Interface
@@ -68,18 +67,18 @@ class UserEventLog(Container):
     __contains__ = IUserEvent
 
     def __init__(self, username, sizelimit=None):
+        super(UserEventLog, self).__init__()
         self.__name__ = username
         self.sizelimit = None
         self.cur_index = 0
-        self._items = OOBTree()
 
     def add_event(self, rawevent):
         if rawevent.username != self.__name__:
             return
 
         if self.sizelimit is not None:
-            while self.sizelimit <= len(self._items):
-                del self._items[min(self._items.keys())]
+            while self.sizelimit <= len(self):
+                del self[self._items.minKey()]
 
         self.cur_index += 1
         item = UserEvent(rawevent, self.cur_index)
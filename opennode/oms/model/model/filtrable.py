@@ -1,7 +1,7 @@
 from grokcore.component import Adapter, context
 from zope.interface import Interface, implements
 
-from opennode.oms.model.schema import get_schema_fields
+from opennode.oms.model.schema import get_descriptor
 from opennode.oms.model.model.base import IModel
 
 
@@ -30,19 +30,17 @@ class ModelFieldFiltrable(Adapter):
 
             return False
 
+        descriptor = get_descriptor(self.context)
+
         def any_field(keyword):
             return any(matches(keyword, field.get(schema(self.context)))
-                       for name, field, schema in get_schema_fields(self.context))
+                       for name, field, schema in descriptor.fields)
 
         def specific_field(fieldname, value):
-            schema = get_schema_fields(self.context)
-            result = filter(lambda (name, field, schema): name == fieldname,
-                            get_schema_fields(self.context))
-
-            if len(result) == 0:
+            if fieldname not in descriptor.fields_by_name:
                 return False
 
-            name, field, schema = result[0]
+            name, field, schema = descriptor.fields_by_name[fieldname]
             fieldvalue = field.get(schema(self.context))
             return matches(value, fieldvalue)
 
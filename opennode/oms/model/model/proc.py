@@ -3,7 +3,7 @@ from __future__ import absolute_import
 import time
 from collections import OrderedDict
 
-from grokcore.component import querySubscriptions, Adapter, context, subscribe, baseclass
+from grokcore.component import Adapter, context, subscribe, baseclass
 from twisted.python import log
 from zope import schema
 from zope.authentication.interfaces import IAuthentication
@@ -13,7 +13,7 @@ from zope.interface import Interface, implements, alsoProvides
 
 from .base import ReadonlyContainer
 from .actions import ActionsContainerExtension, Action, action
-from opennode.oms.util import Singleton
+from opennode.oms.util import Singleton, query_subscriptions
 from opennode.oms.config import get_config
 from opennode.oms.core import IAfterApplicationInitializedEvent
 
@@ -132,7 +132,7 @@ class Proc(ReadonlyContainer):
         self.next_id = 1
 
     def start_daemons(self):
-        for i in querySubscriptions(self, IProcess):
+        for i in query_subscriptions(self, IProcess):
             log.msg('Starting %s' % i, system='proc')
             self.spawn(i)
 
@@ -144,7 +144,8 @@ class Proc(ReadonlyContainer):
         return 'Tasks'
 
     def content(self):
-        res = dict(self.tasks)
+        res = super(Proc, self).content()
+        res.update(self.tasks)
         res['completed'] = CompletedProc(self, self.dead_tasks)
         return res
 
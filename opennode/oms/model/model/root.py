@@ -48,6 +48,8 @@ class RootContainerExtension(Subscription):
     implements(IContainerExtender)
     context(OmsRoot)
 
+    names = ('bin', 'proc', 'plugins', 'stream')
+
     def extend(self):
         return {'bin': Bin(),
                 'proc': Proc(),
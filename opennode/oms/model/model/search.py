@@ -159,6 +159,11 @@ class SearchContainer(ReadonlyContainer):
         provideUtility(self.ids, IIntIds)
         return list(self.catalog.searchResults(**kwargs))
 
+    def count(self, **kwargs):
+        """Number of results of `search`, without loading them"""
+        results = self.catalog.apply(kwargs)
+        return len(results) if results is not None else 0
+
     def search_goog(self, query):
         # hack, zope catalog treats ':' specially
         return self.search(__all=query.replace(':', '_'))
@@ -289,7 +294,7 @@ class Tag(ReadonlyContainer):
             sub_tag = Tag(i, self.searcher, self, self.other_tags, self.tag_path)
 
             # only add it if it yields some results.
-            if TagItems(sub_tag, self.searcher)._items:
+            if self.searcher.count(tags=sub_tag.tag_path):
                 res[i] = sub_tag
         return res
 
@@ -301,6 +306,9 @@ class TagItems(ReadonlyContainer):
         self.__parent__ = parent
         self.searcher = searcher
 
+    def __len__(self):
+        return self.searcher.count(tags=self.__parent__.tag_path)
+
     @property
     def _items(self):
         res = {}
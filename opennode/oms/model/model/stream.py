@@ -119,6 +119,8 @@ class MetricsContainerExtension(Subscription):
     implements(IContainerExtender)
     baseclass()
 
+    names = ('metrics', )
+
     def extend(self):
         return {'metrics': Metrics(self.context)}
 
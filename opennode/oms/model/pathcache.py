@@ -0,0 +1,179 @@
+"""Per-process cache of the resolved paths, see `opennode.oms.model.traversal.traverse_path`.
+
+Maps the oid of the object a traversal starts from and the traversed names to the oids of the
+objects found along the way. Only the leading steps reaching stored children are cached, i.e.
+those for which `__parent__` is the previous object and `__name__` the traversed name; transient
+objects, container extensions, symlinks, `.` and `..` are traversed normally from the last cached
+object. Entries are dropped when an object along them is moved, renamed or deleted, and are
+checked against the parent chain and the stored children of the containers when looked up.
+
+"""
+import threading
+from collections import OrderedDict
+
+import transaction
+from grokcore.component import subscribe
+from persistent import Persistent
+
+from opennode.oms.config import get_config
+from opennode.oms.model.model.base import IModel
+from opennode.oms.model.model.events import IModelMovedEvent, IModelDeletedEvent
+
+
+__all__ = ['lookup', 'store', 'invalidate']
+
+
+class PathCache(object):
+    """Bounded LRU mapping (start oid, names) to the oids of the traversed objects"""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.keys_by_oid = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            oids = self.entries.pop(key, None)
+            if oids is not None:
+                self.entries[key] = oids
+            return oids
+
+    def put(self, key, oids, valid):
+        """Adds the entry, unless `valid()` (evaluated atomically with respect to invalidations)
+        returns False"""
+        with self.lock:
+            if not valid():
+                return
+            if key in self.entries:
+                self._discard(key)
+            self.entries[key] = oids
+            for oid in (key[0], ) + oids:
+                self.keys_by_oid.setdefault(oid, set()).add(key)
+            while len(self.entries) > self.size:
+                self._discard(next(iter(self.entries)))
+
+    def discard(self, key):
+        with self.lock:
+            if key in self.entries:
+                self._discard(key)
+
+    def invalidate(self, oid):
+        with self.lock:
+            for key in list(self.keys_by_oid.get(oid, ())):
+                self._discard(key)
+
+    def _discard(self, key):
+        oids = self.entries.pop(key)
+        for oid in (key[0], ) + oids:
+            keys = self.keys_by_oid.get(oid)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.keys_by_oid[oid]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+_cache = None
+
+
+def get_path_cache():
+    global _cache
+    if _cache is None:
+        _cache = PathCache(get_config().getint('db', 'path_cache_size', 10000))
+    return _cache
+
+
+def _cacheable(obj):
+    # objects behind proxies have to be traversed through them, the readonly replica might
+    # lag behind the invalidations which happen on commit
+    return (issubclass(type(obj), Persistent) and obj._p_oid is not None and obj._p_jar is not None and
+            not obj._p_jar.isReadOnly())
+
+
+def lookup(start, names):
+    """Returns the objects along the longest cached prefix of the `names` traversed from `start`"""
+    cache = get_path_cache()
+    if not cache.size or not names or not _cacheable(start):
+        return []
+
+    for i in xrange(len(names), 0, -1):
+        key = (start._p_oid, tuple(names[:i]))
+        oids = cache.get(key)
+        if oids is None:
+            continue
+
+        objs = _load(start, names, oids)
+        if objs is not None:
+            return objs
+        cache.discard(key)
+    return []
+
+
+def _load(start, names, oids):
+    objs = []
+    parent = start
+    for name, oid in zip(names, oids):
+        try:
+            obj = start._p_jar.get(oid)
+        except KeyError:
+            return None
+        # moved or renamed in a transaction which didn't invalidate this process (yet)
+        if obj.__parent__ is not parent or obj.__name__ != name:
+            return None
+        # removing a child from its container doesn't reset its `__parent__`
+        items = getattr(parent, '_items', None)
+        if items is not None and items.get(name) is not obj:
+            return None
+        objs.append(obj)
+        parent = obj
+    return objs
+
+
+def store(start, names, objs, known=0):
+    """Caches the objects `objs` found traversing `names` from `start`, if more than `known`
+    of them can be cached"""
+    cache = get_path_cache()
+    if not cache.size or not _cacheable(start):
+        return
+
+    oids = []
+    parent = start
+    for name, obj in zip(names, objs):
+        if not _cacheable(obj) or obj.__parent__ is not parent or obj.__name__ != name:
+            break
+        oids.append(obj._p_oid)
+        parent = obj
+
+    if len(oids) > known:
+        jar = start._p_jar
+        # the connection lists the objects changed by the transactions committed after the current
+        # one began: what we've seen might be already moved or deleted
+        cache.put((start._p_oid, tuple(names[:len(oids)])), tuple(oids), lambda: jar._txn_time is None)
+
+
+def invalidate(obj):
+    """Drops the cached paths through `obj`, now and once the current transaction is committed"""
+    oid = getattr(obj, '_p_oid', None)
+    if oid is None:
+        return
+
+    cache = get_path_cache()
+    cache.invalidate(oid)
+    # the transaction changing the object, which isn't the one of the current thread when running
+    # with its own transaction manager (see `opennode.oms.zodb.db.async_transact`)
+    jar = getattr(obj, '_p_jar', None)
+    current = jar.transaction_manager.get() if jar is not None else transaction.get()
+    current.addAfterCommitHook(lambda success: cache.invalidate(oid))
+
+
+@subscribe(IModel, IModelMovedEvent)
+def model_moved(model, event):
+    invalidate(model)
+
+
+@subscribe(IModel, IModelDeletedEvent)
+def model_deleted(model, event):
+    invalidate(model)
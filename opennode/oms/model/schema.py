@@ -1,11 +1,13 @@
 from collections import OrderedDict
+from operator import attrgetter
 import logging
 import sys
 
+from ZODB.blob import Blob as ZODBBlob
 from grokcore.component import context, Adapter, baseclass
 from zope.component import getSiteManager, implementedBy
-from zope.interface import implements
-from zope.schema import TextLine, List, Set, Tuple, Dict, getFieldsInOrder
+from zope.interface import implements, providedBy
+from zope.schema import Field, Text, TextLine, List, Set, Tuple, Dict, getFieldsInOrder
 from zope.schema.interfaces import IFromUnicode
 from zope.security.proxy import removeSecurityProxy
 from zope.security.interfaces import Unauthorized
@@ -28,34 +30,211 @@ class Path(TextLine):
         super(TextLine, self).__init__(*args, **kw)
 
 
+class Blob(Text):
+    """Large text stored in a ZODB blob instead of the object record, see `BlobProperty`.
+
+    Blob fields are not rendered by `model_to_dict` unless explicitly requested.
+    """
+
+
+class BlobProperty(object):
+    """Stores the value of a `Blob` field in a ZODB blob, similarly to what zope.schema's
+    `FieldProperty` does for plain attributes. Loading the object doesn't load the value,
+    which is read from the blob file only when the attribute is accessed.
+
+    >>> class Report(Model):
+    ...     implements(IReport)
+    ...     output = BlobProperty(IReport['output'])
+
+    """
+
+    def __init__(self, field, name=None):
+        self.field = field
+        self.name = name or field.__name__
+        self.attribute = '_blob_%s' % self.name
+
+    def __get__(self, inst, cls=None):
+        if inst is None:
+            return self
+
+        f = self.open(inst)
+        if f is None:
+            return self.field.default
+        with f:
+            return f.read().decode('utf-8')
+
+    def __set__(self, inst, value):
+        field = self.field.bind(inst)
+        field.validate(value)
+        if field.readonly and getattr(inst, self.attribute, None) is not None:
+            raise ValueError(self.name, 'field is readonly')
+
+        if value is None:
+            setattr(inst, self.attribute, None)
+            return
+
+        blob = getattr(inst, self.attribute, None)
+        if blob is None:
+            blob = ZODBBlob()
+            setattr(inst, self.attribute, blob)
+        with blob.open('w') as f:
+            f.write(value.encode('utf-8'))
+
+    def open(self, inst):
+        """Returns a file for streaming the utf-8 encoded value, None if the value is not set"""
+        blob = getattr(inst, self.attribute, None)
+        if blob is not None:
+            return blob.open('r')
+
+
 def model_implements_marker(model, marker):
     return (marker and isinstance(model, type) and hasattr(model, '__markers__')
             and marker in model.__markers__)
 
 
-def get_schemas(model_or_obj, marker=None):
-    model_or_obj = removeSecurityProxy(model_or_obj)
+class SchemaDescriptor(object):
+    """Schemas and fields of a model class, or of a model object with a given set of directly
+    provided (marker) interfaces. Built once per class and set of markers, see `get_descriptor`.
 
-    for schema in get_direct_interfaces(model_or_obj):
-        yield schema
+    """
 
-    model = model_or_obj if isinstance(model_or_obj, type) else type(model_or_obj)
+    def __init__(self, model_or_obj):
+        model = model_or_obj if isinstance(model_or_obj, type) else type(model_or_obj)
 
-    for schema in getSiteManager().adapters._adapters[1].get(implementedBy(model), []):
-        yield schema
+        self.direct_interfaces = tuple(get_direct_interfaces(model_or_obj))
+        if isinstance(model_or_obj, type) or not hasattr(model_or_obj, 'implemented_interfaces'):
+            implemented = self.direct_interfaces
+        else:
+            implemented = model_or_obj.implemented_interfaces()
+        self.features = frozenset(i.__name__ for i in implemented)
+
+        adapted = getSiteManager().adapters._adapters[1].get(implementedBy(model), {})
+        self.schemas = self.direct_interfaces + tuple(adapted)
+
+        self.fields = tuple((name, field, schema) for schema in self.schemas
+                            for name, field in getFieldsInOrder(schema))
+        self.titles = OrderedDict((name, field.title) for name, field, schema in self.fields)
+        self.fields_by_name = {}
+        for name, field, schema in reversed(self.fields):
+            self.fields_by_name[name] = (name, field, schema)
+        self.blob_names = frozenset(name for name, field, schema in self.fields if isinstance(field, Blob))
+        self.attribute_names = frozenset(self.fields_by_name).union(('mtime', 'ctime'))
+
+        self.spec = implementedBy(model_or_obj) if isinstance(model_or_obj, type) else providedBy(model_or_obj)
+        self.serializers = {}
+
+    def serializer(self, use_titles=False, use_fields=False, blobs=False, attrs=None):
+        """Returns the `Serializer` for the `model_to_dict` options"""
+        if blobs is not True:
+            blobs = self.blob_names.intersection(blobs or ())
+        if attrs is not None:
+            attrs = self.attribute_names.intersection(attrs)
+        key = (use_titles, use_fields, blobs, attrs)
+        serializer = self.serializers.get(key)
+        if serializer is None:
+            serializer = self.serializers[key] = Serializer(self, use_titles, use_fields, blobs, attrs)
+        return serializer
+
+
+class Serializer(object):
+    """`model_to_dict` compiled for a `SchemaDescriptor` and a set of options: keys, getters and
+    which schemas need to be adapted are resolved once, schemas are adapted once per object.
+
+    """
+
+    def __init__(self, descriptor, use_titles, use_fields, blobs, attrs):
+        self.groups = []
+        for name, field, schema in descriptor.fields:
+            if name in descriptor.blob_names and blobs is not True and name not in blobs:
+                continue
+            if attrs is not None and name not in attrs:
+                continue
+
+            if use_fields:
+                key = field
+            elif not use_titles:
+                key = name.encode('utf8')
+            else:
+                key = field.title
+            # most fields just read the attribute
+            getter = attrgetter(name) if type(field).get.im_func is Field.get.im_func else field.get
+
+            if not self.groups or self.groups[-1][0] is not schema:
+                self.groups.append((schema, descriptor.spec.isOrExtends(schema), []))
+            self.groups[-1][2].append((key, getter))
+
+        self.times = [i for i in ('mtime', 'ctime') if attrs is None or i in attrs]
+        self.projected = attrs is not None
+
+    def __call__(self, obj, ordered=True):
+        data = OrderedDict() if ordered else {}
+        error_attributes = []
+
+        for schema, provided, getters in self.groups:
+            try:
+                adapted = obj if provided else schema(obj)
+            except Unauthorized:
+                error_attributes.extend(key for key, getter in getters)
+                log.warning('Object %s (schema %s): access unauthorized!', obj, schema, exc_info=sys.exc_info())
+                continue
+
+            for key, getter in getters:
+                try:
+                    data[key] = getter(adapted)
+                except Unauthorized:
+                    # skip field
+                    error_attributes.append(key)
+                    log.warning('Object %s (attribute %s of %s): access unauthorized!', obj, key, adapted,
+                                exc_info=sys.exc_info())
+
+        for i in self.times:
+            data[i] = getattr(obj, i)
+
+        # a projection only leaves out the unreadable fields, as the whole object would
+        if error_attributes and not data and not self.projected:
+            raise Unauthorized((obj, error_attributes, 'read'))
+        return data
+
+
+# {(class, provided spec): (registry, registry generation, spec resolution order, descriptor)}
+_descriptors = {}
+
+
+def get_descriptor(model_or_obj):
+    """Returns the `SchemaDescriptor` of a model class or object.
+
+    Descriptors are rebuilt when the component registry changes (e.g. new schema adapters
+    are registered) or when the interfaces provided by the class or the object change.
+    """
+    model_or_obj = removeSecurityProxy(model_or_obj)
+    if isinstance(model_or_obj, type):
+        key = (model_or_obj, None)
+        spec = implementedBy(model_or_obj)
+    else:
+        spec = providedBy(model_or_obj)
+        key = (type(model_or_obj), spec)
+
+    registry = getSiteManager().adapters
+    entry = _descriptors.get(key)
+    if (entry is None or entry[0] is not registry or entry[1] != registry._generation or
+            entry[2] is not spec.__iro__):
+        entry = _descriptors[key] = (registry, registry._generation, spec.__iro__,
+                                     SchemaDescriptor(model_or_obj))
+    return entry[3]
 
+
+def get_schemas(model_or_obj, marker=None):
+    schemas = list(get_descriptor(model_or_obj).schemas)
     if model_implements_marker(model_or_obj, marker):
-        yield marker
+        schemas.append(marker)
+    return schemas
 
 
 def get_schema_fields(model_or_obj, marker=None):
-    for schema in get_schemas(model_or_obj):
-        for name, field in getFieldsInOrder(schema):
-            yield name, field, schema
-
+    fields = list(get_descriptor(model_or_obj).fields)
     if model_implements_marker(model_or_obj, marker):
-        for name, field in getFieldsInOrder(marker):
-            yield name, field, marker
+        fields.extend((name, field, marker) for name, field in getFieldsInOrder(marker))
+    return fields
 
 
 class CollectionFromUnicode(Adapter):
@@ -102,31 +281,8 @@ class DictFromUnicode(Adapter):
         return self.context._type([convert(k, v) for k, v in res.items()])
 
 
-def model_to_dict(obj, use_titles=False, use_fields=False):
-    data = OrderedDict()
-    got_unauthorized = False
-
-    error_attributes = []
-    for key, field, schema in get_schema_fields(obj):
-        if use_fields:
-            key = field
-        elif not use_titles:
-            key = key.encode('utf8')
-        else:
-            key = field.title
-        try:
-            data[key] = field.get(schema(obj))
-        except Unauthorized:
-            # skip field
-            got_unauthorized = True
-            error_attributes.append(key)
-            log.warning('Object %s (attribute %s of %s): access unauthorized!', obj, key, schema(obj),
-                        exc_info=sys.exc_info())
-            continue
-
-    data['mtime'] = obj.mtime
-    data['ctime'] = obj.ctime
-
-    if got_unauthorized and not data:
-        raise Unauthorized((obj, error_attributes, 'read'))
-    return data
+def model_to_dict(obj, use_titles=False, use_fields=False, blobs=False, attrs=None, ordered=True):
+    """`blobs` is either a boolean or the names of the `Blob` fields to be rendered (none by default,
+    as reading them is expensive), `attrs` the names of the fields to be rendered (all of them by
+    default). Unless `ordered` is set a plain dict is returned, which is noticeably faster to build."""
+    return get_descriptor(obj).serializer(use_titles, use_fields, blobs, attrs)(obj, ordered)
@@ -3,8 +3,11 @@ import re
 
 from grokcore.component import Adapter, implements, baseclass
 from zope.interface import Interface
+from zope.security.proxy import removeSecurityProxy
 
+from opennode.oms.model import pathcache
 from opennode.oms.model.model.symlink import follow_symlinks
+from opennode.oms.util import query_adapter
 
 
 __all__ = ['traverse_path', 'traverse1']
@@ -56,12 +59,15 @@ def traverse_path(obj, path):
     if not path:
         return [obj], []
 
-    ret = [obj]
+    names = path
+    cached = pathcache.lookup(obj, names)
+
+    ret = [obj] + cached
+    path = path[len(cached):]
     while path:
         name = path[0]
-        try:
-            traverser = ITraverser(ret[-1])
-        except TypeError:
+        traverser = query_adapter(ret[-1], ITraverser)
+        if traverser is None:
             break
 
         next_obj = follow_symlinks(traverser.traverse(name))
@@ -72,6 +78,9 @@ def traverse_path(obj, path):
         ret.append(next_obj)
         path = path[1:]
 
+    if len(ret) > len(cached) + 1:
+        pathcache.store(obj, names, ret[1:], known=len(cached))
+
     return ret[1:], path
 
 
@@ -93,11 +102,29 @@ def traverse1(path):
 
 
 def canonical_path(item):
-    path = []
-    from opennode.oms.security.authentication import sudo
-    while item:
-        p = sudo(follow_symlinks(sudo(item)))
-        assert p.__name__ is not None, '%s.__name__ is None' % p
-        path.insert(0, p.__name__)
-        item = p.__parent__
-    return '/'.join(path)
+    """Returns the absolute path of `item` (following symlinks), regardless of the permissions.
+
+    Paths are memoized in the volatile `_v_canonical_path` attribute of each object, along with the
+    parent, the name and the parent path they were computed from: they are recomputed only after
+    the object or one of its ancestors has been moved or renamed.
+
+    """
+    item = removeSecurityProxy(follow_symlinks(removeSecurityProxy(item)))
+    name = item.__name__
+    assert name is not None, '%s.__name__ is None' % item
+
+    parent = item.__parent__
+    if parent is None:
+        return name
+    parent_path = canonical_path(parent)
+
+    memo = getattr(item, '_v_canonical_path', None)
+    if memo is not None and memo[0] is parent and memo[1] == name and memo[2] is parent_path:
+        return memo[3]
+
+    path = parent_path + '/' + name
+    try:
+        item._v_canonical_path = (parent, name, parent_path, path)
+    except AttributeError:
+        pass
+    return path
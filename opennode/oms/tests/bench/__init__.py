@@ -0,0 +1,22 @@
+"""Micro-benchmarks of hot code paths.
+
+They are not collected by the test runner, run them with e.g.::
+
+    python -m opennode.oms.tests.bench.proxy
+
+"""
+import timeit
+
+
+def bench(label, fun, number=10000, repeat=3):
+    """Prints the best time per call of `fun` in microseconds and returns it"""
+    best = min(timeit.repeat(fun, number=number, repeat=repeat)) / number * 1e6
+    print '%-50s %10.3f us' % (label, best)
+    return best
+
+
+def compare(label, raw, proxied, number=10000):
+    """Runs the same operation on raw and proxied objects and prints the overhead"""
+    raw_time = bench('%s (raw)' % label, raw, number)
+    proxied_time = bench('%s (proxied)' % label, proxied, number)
+    print '%-50s %10.1fx' % ('%s overhead' % label, proxied_time / raw_time if raw_time else 0)
@@ -0,0 +1,42 @@
+"""Attribute access, iteration and method calls through persistent proxies vs raw objects"""
+from opennode.oms.model.model.base import Container, Model
+from opennode.oms.tests.bench import bench, compare
+from opennode.oms.zodb.proxy import make_persistent_proxy
+
+
+class Item(Model):
+
+    def __init__(self, name):
+        self.__name__ = name
+        self.tags = ('a', 'b', 'c')
+
+    def title(self):
+        return self.__name__.upper()
+
+
+class Items(Container):
+    __contains__ = Item
+
+
+def main(size=1000):
+    items = Items()
+    for i in xrange(size):
+        items.add(Item('item-%s' % i))
+    item = items['item-0']
+
+    context = {}
+    pitems = make_persistent_proxy(items, context)
+    pitem = make_persistent_proxy(item, context)
+
+    compare('attribute access', lambda: item.__name__, lambda: pitem.__name__, number=100000)
+    compare('tuple attribute', lambda: item.tags, lambda: pitem.tags, number=100000)
+    compare('method call', lambda: item.title(), lambda: pitem.title(), number=100000)
+    compare('iteration over %s children' % size,
+            lambda: [i.__name__ for i in items],
+            lambda: [i.__name__ for i in pitems], number=100)
+    bench('make_persistent_proxy (model)', lambda: make_persistent_proxy(item, context), number=100000)
+    bench('make_persistent_proxy (string)', lambda: make_persistent_proxy('x', context), number=100000)
+
+
+if __name__ == '__main__':
+    main()
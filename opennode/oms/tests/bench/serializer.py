@@ -0,0 +1,82 @@
+"""Rendering of models with `model_to_dict`, compiled serializers vs the former field by field path"""
+import sys
+from collections import OrderedDict
+
+from grokcore.component import Adapter, context
+from zope import schema
+from zope.component import provideAdapter
+from zope.interface import Interface, implements
+from zope.security.interfaces import Unauthorized
+
+from opennode.oms.model.model.base import Model
+from opennode.oms.model.schema import get_schema_fields, model_to_dict
+from opennode.oms.tests.bench import bench
+
+
+class IItem(Interface):
+    hostname = schema.TextLine(title=u"Host name")
+    state = schema.Choice(title=u"State", values=(u'active', u'inactive'))
+    memory = schema.Int(title=u"Memory")
+    cpus = schema.Int(title=u"CPUs")
+    tags = schema.Set(title=u"Tags", value_type=schema.TextLine())
+
+
+class IItemStats(Interface):
+    load = schema.Float(title=u"Load")
+    uptime = schema.Int(title=u"Uptime")
+
+
+class Item(Model):
+    implements(IItem)
+
+    def __init__(self, name):
+        self.__name__ = name
+        self.hostname = u'host-%s' % name
+        self.state = u'active'
+        self.memory = 2048
+        self.cpus = 4
+        self.tags = set([u'a', u'b'])
+
+
+class ItemStats(Adapter):
+    implements(IItemStats)
+    context(Item)
+
+    load = 0.5
+    uptime = 3600
+
+
+def legacy_model_to_dict(obj, use_titles=False):
+    """`model_to_dict` as it was before the compiled serializers"""
+    data = OrderedDict()
+    for key, field, schema in get_schema_fields(obj):
+        key = field.title if use_titles else key.encode('utf8')
+        try:
+            data[key] = field.get(schema(obj))
+        except Unauthorized:
+            sys.exc_clear()
+            continue
+    data['mtime'] = obj.mtime
+    data['ctime'] = obj.ctime
+    return data
+
+
+def main(size=1000):
+    provideAdapter(ItemStats, adapts=(Item, ), provides=IItemStats)
+    items = [Item(str(i)) for i in xrange(size)]
+    item = items[0]
+
+    assert legacy_model_to_dict(item) == model_to_dict(item)
+
+    bench('legacy model_to_dict', lambda: legacy_model_to_dict(item), number=10000)
+    bench('model_to_dict', lambda: model_to_dict(item), number=10000)
+    bench('legacy model_to_dict (titles)', lambda: legacy_model_to_dict(item, use_titles=True), number=10000)
+    bench('model_to_dict (titles)', lambda: model_to_dict(item, use_titles=True), number=10000)
+    bench('legacy listing of %s items' % size, lambda: [legacy_model_to_dict(i) for i in items], number=10)
+    bench('listing of %s items' % size, lambda: [model_to_dict(i) for i in items], number=10)
+    bench('listing of %s items (unordered)' % size, lambda: [model_to_dict(i, ordered=False) for i in items],
+          number=10)
+
+
+if __name__ == '__main__':
+    main()
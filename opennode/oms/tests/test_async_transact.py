@@ -0,0 +1,78 @@
+import transaction
+from nose.tools import eq_
+from twisted.internet import defer
+
+from opennode.oms.tests.util import run_in_reactor, clean_db
+from opennode.oms.zodb import db
+
+
+def root_attr(name):
+    return getattr(db.get_root()['oms_root'], name, None)
+
+
+@run_in_reactor
+@clean_db
+def test_async_transact_waits_without_committing():
+    pending = defer.Deferred()
+    results = []
+
+    @db.async_transact
+    def set_hostname():
+        value = yield pending
+        db.get_root()['oms_root'].test_hostname = value
+        defer.returnValue(value.upper())
+
+    set_hostname().addCallback(results.append)
+    eq_(results, [])
+
+    pending.callback('localhost')
+    eq_(results, ['LOCALHOST'])
+
+    transaction.abort()
+    eq_(root_attr('test_hostname'), 'localhost')
+
+
+@run_in_reactor
+@clean_db
+def test_async_transact_rollback():
+    results = []
+
+    @db.async_transact
+    def failing():
+        db.get_root()['oms_root'].test_hostname = 'bad'
+        yield defer.succeed(None)
+        raise ValueError('validation failed')
+
+    @db.async_transact
+    def readonly():
+        db.get_root()['oms_root'].test_hostname = 'temporary'
+        value = yield defer.succeed('value')
+        defer.returnValue(db.RollbackValue(value))
+
+    failing().addErrback(lambda f: results.append(f.trap(ValueError)))
+    readonly().addCallback(results.append)
+    eq_(results, [ValueError, 'value'])
+
+    transaction.abort()
+    eq_(root_attr('test_hostname'), None)
+
+
+@run_in_reactor
+@clean_db
+def test_async_transact_failure_thrown_into_generator():
+    results = []
+
+    @db.async_transact
+    def recovering():
+        try:
+            yield defer.fail(KeyError('missing'))
+        except KeyError:
+            defer.returnValue('recovered')
+
+    @db.async_transact
+    def plain():
+        return 'not a generator'
+
+    recovering().addCallback(results.append)
+    plain().addCallback(results.append)
+    eq_(results, ['recovered', 'not a generator'])
@@ -0,0 +1,58 @@
+import transaction
+from nose.tools import eq_
+from zope import schema
+from zope.interface import Interface, implements
+
+from opennode.oms.model.model.base import Model
+from opennode.oms.model.schema import Blob, BlobProperty, model_to_dict
+from opennode.oms.tests.util import run_in_reactor, clean_db
+from opennode.oms.zodb import db
+from opennode.oms.zodb.snapshot import make_snapshot
+
+
+class IReport(Interface):
+    title = schema.TextLine(title=u"Title")
+    output = Blob(title=u"Output", required=False)
+
+
+class Report(Model):
+    implements(IReport)
+
+    output = BlobProperty(IReport['output'])
+
+    def __init__(self, title):
+        self.title = title
+
+
+@run_in_reactor
+@clean_db
+def test_blob_property():
+    report = Report(u'report')
+    eq_(report.output, None)
+
+    report.output = u'\u2603' * 100000
+    db.get_root()['oms_root'].test_report = report
+    transaction.commit()
+    eq_(len(report.output), 100000)
+
+    report.output = u'updated'
+    transaction.commit()
+
+    report._p_invalidate()
+    assert '_blob_output' not in report.__dict__
+    eq_(report.output, u'updated')
+    with Report.output.open(report) as f:
+        eq_(f.read(), 'updated')
+
+
+@run_in_reactor
+@clean_db
+def test_blob_not_rendered_by_default():
+    report = Report(u'report')
+    report.output = u'big'
+
+    assert 'output' not in model_to_dict(report)
+    eq_(model_to_dict(report, blobs=True)['output'], u'big')
+    assert 'output' not in model_to_dict(report, blobs=['other'])
+    eq_(model_to_dict(report, blobs=['output'])['output'], u'big')
+    assert 'output' not in make_snapshot(report)
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import transaction
+from nose.tools import eq_, assert_raises
+from ZODB import DB
+from ZODB.FileStorage import FileStorage
+from ZODB.blob import Blob
+
+from opennode.oms.tools.compress_db import rewrite
+from opennode.oms.zodb import db
+
+
+class CompressDbTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'data.fs')
+
+        database = DB(FileStorage(self.path))
+        connection = database.open()
+        connection.root()['tags'] = [u'tag-%s' % (i % 10) for i in range(1000)]
+        transaction.commit()
+        connection.close()
+        database.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read(self, key='tags', blob_dir=None):
+        database = DB(db.wrap_storage(FileStorage(self.path, read_only=True, blob_dir=blob_dir)))
+        try:
+            value = database.open().root()[key]
+            return value.open().read() if isinstance(value, Blob) else value
+        finally:
+            database.close()
+
+    def test_rewrite(self):
+        size = os.path.getsize(self.path)
+
+        rewrite(self.path)
+        assert os.path.getsize(self.path) < size / 2
+        assert os.path.exists(self.path + '.orig')
+
+        with mock.patch.object(db, 'get_compression', lambda: 'zlib'):
+            eq_(len(self.read()), 1000)
+        # compressed records are readable with compression turned off
+        eq_(len(self.read()), 1000)
+
+        os.unlink(self.path + '.orig')
+        rewrite(self.path, decompress=True)
+        eq_(self.read()[-1], u'tag-9')
+
+    def test_rewrite_blobs(self):
+        blob_dir = os.path.join(self.dir, 'blobs')
+        database = DB(FileStorage(self.path, blob_dir=blob_dir))
+        connection = database.open()
+        connection.root()['blob'] = Blob('blob data')
+        transaction.commit()
+        connection.close()
+        database.close()
+
+        rewrite(self.path, blob_dir=blob_dir)
+        assert os.path.isdir(blob_dir + '.orig')
+        eq_(self.read('blob', blob_dir=blob_dir), 'blob data')
+
+        with assert_raises(Exception):
+            rewrite(self.path, blob_dir=blob_dir, decompress=True)
+
+
+def test_unknown_compression():
+    with mock.patch.object(db.get_config(), 'getstring', lambda *args: 'lzma'):
+        with assert_raises(Exception):
+            db.wrap_storage(None)
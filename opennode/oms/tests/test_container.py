@@ -0,0 +1,167 @@
+import unittest
+
+from grokcore.component import Subscription, context
+from nose.tools import eq_
+from zope.component import provideSubscriptionAdapter
+from zope.interface import implements
+
+from opennode.oms.model.model.base import Container, ReadonlyContainer, Model, count_children
+from opennode.oms.model.model.base import IContainerExtender, IContainerInjector
+
+
+class Child(Model):
+
+    def __init__(self, name):
+        self.__name__ = name
+
+
+class Children(Container):
+    __name__ = 'children'
+
+
+class Listing(ReadonlyContainer):
+
+    def content(self):
+        return {'computed': Child('computed')}
+
+
+class ChildrenInjector(Subscription):
+    implements(IContainerInjector)
+    context(Children)
+
+    def inject(self):
+        return {'injected': Child('injected')}
+
+
+class NamedExtension(Subscription):
+    implements(IContainerExtender)
+    context(Children)
+
+    names = ('named', )
+    calls = 0
+
+    def extend(self):
+        NamedExtension.calls += 1
+        return {'named': Child('named')}
+
+
+class UnnamedExtension(Subscription):
+    implements(IContainerExtender)
+    context(Children)
+
+    calls = 0
+
+    def extend(self):
+        UnnamedExtension.calls += 1
+        return {'unnamed': Child('unnamed')}
+
+
+provideSubscriptionAdapter(ChildrenInjector, adapts=(Children, ))
+provideSubscriptionAdapter(NamedExtension, adapts=(Children, ))
+provideSubscriptionAdapter(UnnamedExtension, adapts=(Children, ))
+
+
+class ContainerLookupTestCase(unittest.TestCase):
+
+    def setUp(self):
+        NamedExtension.calls = UnnamedExtension.calls = 0
+        self.container = Children()
+        for i in range(100):
+            self.container.add(Child(str(i)))
+
+    def test_stored_child_does_not_extend(self):
+        eq_(self.container['42'].__name__, '42')
+        eq_(NamedExtension.calls, 0)
+        eq_(UnnamedExtension.calls, 0)
+
+    def test_injected_child(self):
+        child = self.container['injected']
+        eq_(child.__parent__, self.container)
+        assert 'injected' in self.container._items
+
+    def test_named_extension(self):
+        child = self.container['named']
+        eq_(child.__parent__, self.container)
+        assert child.__transient__
+        eq_(NamedExtension.calls, 1)
+        eq_(UnnamedExtension.calls, 0)
+
+    def test_unnamed_extension(self):
+        eq_(self.container['unnamed'].__name__, 'unnamed')
+        eq_(NamedExtension.calls, 0)
+
+    def test_missing(self):
+        eq_(self.container['missing'], None)
+        eq_(NamedExtension.calls, 0)
+        eq_(UnnamedExtension.calls, 1)
+
+    def test_content(self):
+        eq_(len(self.container.listnames()), 103)
+        eq_(sorted(self.container.listnames())[-3:], ['injected', 'named', 'unnamed'])
+
+    def test_overridden_content(self):
+        eq_(Listing()['computed'].__name__, 'computed')
+        eq_(Listing()['missing'], None)
+
+    def test_itercontent(self):
+        names = [child.__name__ for child in self.container.itercontent()]
+        eq_(names, sorted(self.container.listnames()))
+        eq_([child.__name__ for child in self.container.itercontent('98')], ['99', 'injected', 'named', 'unnamed'])
+        eq_([child.__name__ for child in self.container.itercontent('unnamed')], [])
+        eq_([child.__name__ for child in Listing().itercontent()], ['computed'])
+
+    def test_stored_child_precedes_extension(self):
+        stored = Child('named')
+        self.container.add(stored)
+
+        assert self.container['named'] is stored
+        assert self.container.content()['named'] is stored
+        eq_([child for child in self.container.itercontent() if child.__name__ == 'named'], [stored])
+        eq_(list(self.container.itercontent('injected'))[0], stored)
+
+
+class ContainerCountTestCase(unittest.TestCase):
+
+    def test_count(self):
+        container = Children()
+        eq_(len(container), 0)
+        assert container
+
+        for i in range(10):
+            container.add(Child(str(i)))
+        eq_(len(container), 10)
+
+        # re-adding or renaming doesn't change the count, overwriting does
+        container.add(container['0'])
+        container.rename('0', 'renamed')
+        eq_(len(container), 10)
+        container.rename('renamed', '1')
+        eq_(len(container), 9)
+
+        container.remove(container['2'])
+        del container['3']
+        eq_(len(container), 7)
+
+        container['injected']
+        eq_(len(container), 8)
+        eq_(len(container), len(container._items))
+
+    def test_count_children(self):
+        root = Children()
+        for i in range(3):
+            child = Children()
+            child.__name__ = 'children-%s' % i
+            root.add(child)
+            root.add(Child(str(i)))
+        # as created before the counters were introduced
+        containers = [root] + [i for i in root._items.values() if isinstance(i, Children)]
+        for container in containers:
+            del container._count
+
+        eq_(len(root), 6)
+        eq_(count_children(root), 4)
+        eq_(count_children(root), 0)
+        eq_([len(i) for i in containers], [6, 0, 0, 0])
+
+        root.add(Child('added'))
+        eq_(len(root), 7)
@@ -0,0 +1,88 @@
+import unittest
+
+from grokcore.component import Subscription, Adapter, context, queryOrderedSubscriptions
+from nose.tools import eq_
+from zope.component import provideSubscriptionAdapter, provideAdapter, getGlobalSiteManager
+from zope.interface import Interface, implements, alsoProvides
+
+from opennode.oms.util import query_subscriptions, query_adapter
+
+
+class ITarget(Interface):
+    pass
+
+
+class IMarker(Interface):
+    pass
+
+
+class ISubscriber(Interface):
+    pass
+
+
+class IAdapted(Interface):
+    pass
+
+
+class Target(object):
+    implements(ITarget)
+
+
+class First(Subscription):
+    implements(ISubscriber)
+    context(ITarget)
+
+
+class Second(Subscription):
+    implements(ISubscriber)
+    context(ITarget)
+
+
+class Marked(Subscription):
+    implements(ISubscriber)
+    context(IMarker)
+
+
+class Adapted(Adapter):
+    implements(IAdapted)
+    context(ITarget)
+
+
+class LookupCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        provideSubscriptionAdapter(Second, adapts=(ITarget, ), provides=ISubscriber)
+        provideSubscriptionAdapter(First, adapts=(ITarget, ), provides=ISubscriber)
+
+    def tearDown(self):
+        registry = getGlobalSiteManager()
+        for cls, required in ((First, ITarget), (Second, ITarget), (Marked, IMarker)):
+            registry.unregisterSubscriptionAdapter(cls, (required, ), ISubscriber)
+        registry.unregisterAdapter(Adapted, (ITarget, ), IAdapted)
+
+    def test_subscriptions(self):
+        target = Target()
+        eq_(sorted(type(i).__name__ for i in query_subscriptions(target, ISubscriber)), ['First', 'Second'])
+
+    def test_ordered(self):
+        target = Target()
+        eq_([type(i) for i in query_subscriptions(target, ISubscriber, ordered=True)],
+            [type(i) for i in queryOrderedSubscriptions(target, ISubscriber)])
+
+    def test_registration_invalidates(self):
+        target = Target()
+        alsoProvides(target, IMarker)
+        eq_(len(query_subscriptions(target, ISubscriber)), 2)
+
+        provideSubscriptionAdapter(Marked, adapts=(IMarker, ), provides=ISubscriber)
+        eq_(len(query_subscriptions(target, ISubscriber)), 3)
+        eq_(len(query_subscriptions(Target(), ISubscriber)), 2)
+
+    def test_adapter(self):
+        target = Target()
+        eq_(query_adapter(target, IAdapted), None)
+        eq_(query_adapter(target, IAdapted, 'default'), 'default')
+
+        provideAdapter(Adapted, adapts=(ITarget, ), provides=IAdapted)
+        eq_(query_adapter(target, IAdapted).context, target)
+        eq_(query_adapter(target, ITarget), target)
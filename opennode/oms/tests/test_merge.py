@@ -0,0 +1,97 @@
+import shutil
+import tempfile
+import unittest
+
+import transaction
+from nose.tools import eq_, assert_raises
+from ZODB import DB
+from ZODB.FileStorage import FileStorage
+from ZODB.POSException import ConflictError
+
+from opennode.oms.model.model.base import Model
+from opennode.oms.zodb.merge import merge_states, merge_set_union, merge_last_writer
+
+
+class Compute(Model):
+    _merge_policies = dict(state=merge_last_writer)
+
+    def __init__(self):
+        super(Compute, self).__init__()
+        self.hostname = 'a'
+        self.state = 'inactive'
+        self.ports = [22]
+        self._tags = set(['a', 'b'])
+
+
+def test_merge_states():
+    old = dict(a=1, b=2, c=3)
+    eq_(merge_states(old, dict(a=10, b=2, c=3), dict(a=1, b=20)), dict(a=10, b=20))
+    eq_(merge_states(old, dict(a=10, b=2, c=3), dict(a=11, b=2, c=3)), dict(a=11, b=2, c=3))
+
+    with assert_raises(ConflictError):
+        merge_states(dict(a=[]), dict(a=[1]), dict(a=[2]))
+
+    with assert_raises(ConflictError):
+        merge_states((dict(), dict()), dict(), dict())
+
+
+def test_merge_set_union():
+    eq_(merge_set_union(set('ab'), set('abc'), set('bd')), set('bcd'))
+    eq_(merge_set_union(None, set('a'), set('b')), set('ab'))
+
+
+def test_model_merge_policies():
+    policies = Compute.get_merge_policies()
+    eq_(sorted(policies), ['_mtime', '_tags', 'state'])
+
+    old = dict(_mtime=1.0, _tags=set(['a']), ports=[22])
+    merged = Compute()._p_resolveConflict(old,
+                                          dict(_mtime=3.0, _tags=set(['a', 'x']), ports=[22]),
+                                          dict(_mtime=2.0, _tags=set(), ports=[22, 80]))
+    eq_(merged, dict(_mtime=3.0, _tags=set(['x']), ports=[22, 80]))
+
+
+class ConflictResolutionTestCase(unittest.TestCase):
+    """Concurrent transactions on a real storage, the test db doesn't resolve conflicts"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db = DB(FileStorage('%s/data.fs' % self.dir))
+
+        self.tm1, self.tm2 = transaction.TransactionManager(), transaction.TransactionManager()
+        self.conn1, self.conn2 = self.db.open(self.tm1), self.db.open(self.tm2)
+
+        self.conn1.root()['compute'] = Compute()
+        self.tm1.commit()
+        self.conn2.sync()
+
+    def tearDown(self):
+        self.conn1.close()
+        self.conn2.close()
+        self.db.close()
+        shutil.rmtree(self.dir)
+
+    def test_concurrent_updates(self):
+        c1, c2 = self.conn1.root()['compute'], self.conn2.root()['compute']
+
+        c1.hostname = 'b'
+        c1._tags = c1._tags | set(['c'])
+        c2.state = 'active'
+        c2._tags = c2._tags - set(['a'])
+
+        self.tm1.commit()
+        self.tm2.commit()
+
+        self.conn1.sync()
+        compute = self.conn1.root()['compute']
+        eq_((compute.hostname, compute.state, compute._tags), ('b', 'active', set(['b', 'c'])))
+        eq_(compute._mtime, max(c1._mtime, c2._mtime))
+
+    def test_unresolvable(self):
+        self.conn1.root()['compute'].ports = [22, 80]
+        self.conn2.root()['compute'].ports = [22, 443]
+
+        self.tm1.commit()
+        with assert_raises(ConflictError):
+            self.tm2.commit()
+        self.tm2.abort()
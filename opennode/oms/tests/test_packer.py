@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import transaction
+from nose.tools import eq_
+from ZODB import DB
+from ZODB.FileStorage import FileStorage
+
+from opennode.oms.zodb import db, packer
+
+
+class PackTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db = DB(FileStorage(os.path.join(self.dir, 'data.fs')))
+
+        connection = self.db.open()
+        for i in range(20):
+            connection.root()['value'] = 'x' * 1000 + str(i)
+            transaction.commit()
+        connection.close()
+
+        self.patches = [mock.patch.object(db, '_db', self.db),
+                        mock.patch.object(db, 'get_db_dir', lambda: self.dir),
+                        mock.patch.object(packer, 'set_idle_io_priority', lambda: None),
+                        mock.patch.object(packer, 'pack_stats', packer.PackStatistics())]
+        for i in self.patches:
+            i.start()
+
+    def tearDown(self):
+        for i in self.patches:
+            i.stop()
+        self.db.close()
+        shutil.rmtree(self.dir)
+
+    def test_pack(self):
+        size = packer.get_storage_size()
+        packer.pack_database(0)
+
+        stats = packer.pack_stats
+        eq_(stats.packs, 1)
+        eq_(stats.size, packer.get_storage_size())
+        eq_(stats.last_reclaimed, size - stats.size)
+        assert stats.last_reclaimed > 10000
+        assert not stats.running and stats.last_duration > 0
+
+    def test_pack_error(self):
+        with mock.patch.object(self.db, 'pack', side_effect=Exception('disk full')):
+            packer.pack_database(0)
+        eq_(packer.pack_stats.packs, 0)
+        eq_(packer.pack_stats.errors, 1)
+        eq_(packer.pack_stats.last_error, 'disk full')
+        assert not packer.pack_stats.running
+
+    def test_pack_days(self):
+        packer.pack_database(1)
+        eq_(packer.pack_stats.last_reclaimed, 0)
@@ -0,0 +1,143 @@
+import mock
+import transaction
+from nose.tools import eq_
+from twisted.internet import defer
+
+from opennode.oms.model import pathcache, traversal
+from opennode.oms.model.model.symlink import Symlink
+from opennode.oms.model.traversal import traverse1, canonical_path
+from opennode.oms.security.authentication import sudo
+from opennode.oms.tests.test_compute import Compute
+from opennode.oms.tests.util import run_in_reactor, clean_db
+from opennode.oms.zodb import db
+
+
+def _setup():
+    oms_root = db.get_root()['oms_root']
+    machines = oms_root['machines']
+    compute = Compute(u'tux', u'active')
+    machines.add(compute)
+    transaction.commit()
+    return oms_root, machines, compute
+
+
+def _no_traversal(*args):
+    raise AssertionError('traversed')
+
+
+@run_in_reactor
+@clean_db
+def test_cached_path():
+    with mock.patch.object(pathcache, '_cache', pathcache.PathCache(10)):
+        oms_root, machines, compute = _setup()
+        path = '/machines/%s' % compute.__name__
+
+        eq_(traverse1(path), compute)
+        eq_(pathcache._cache.get((oms_root._p_oid, ('machines', compute.__name__))),
+            (machines._p_oid, compute._p_oid))
+
+        with mock.patch.object(traversal, 'query_adapter', _no_traversal):
+            eq_(traverse1(path), compute)
+            eq_(traversal.traverse_path(oms_root, path), ([machines, compute], []))
+
+        # transient children are traversed, the stored prefix is still cached
+        eq_(traverse1(path + '/actions').__name__, 'actions')
+        eq_(len(pathcache._cache), 1)
+
+
+@run_in_reactor
+@clean_db
+def test_invalidation():
+    with mock.patch.object(pathcache, '_cache', pathcache.PathCache(10)):
+        oms_root, machines, compute = _setup()
+        name = compute.__name__
+
+        traverse1('/machines/%s' % name)
+        machines.rename(name, 'renamed')
+        eq_(len(pathcache._cache), 0)
+        eq_(traverse1('/machines/%s' % name), None)
+        eq_(traverse1('/machines/renamed'), compute)
+
+        del machines['renamed']
+        eq_(traverse1('/machines/renamed'), None)
+        eq_(pathcache._cache.keys_by_oid.get(compute._p_oid), None)
+
+
+@run_in_reactor
+@clean_db
+def test_invalidation_in_async_transaction():
+    def begin(tx):
+        # as outside of the tests, where async transactions have their own transaction manager
+        tx.transaction_manager = transaction.TransactionManager()
+        tx.connection = db.get_db().open(transaction_manager=tx.transaction_manager)
+        tx.transaction_manager.begin()
+        db._connection.x = tx.connection
+        tx.generator = tx.fun(*tx.args, **tx.kwargs)
+
+    pending = defer.Deferred()
+
+    @db.async_transact
+    def rename(name):
+        db.get_root()['oms_root']['machines'].rename(name, 'renamed')
+        yield pending
+
+    with mock.patch.object(pathcache, '_cache', pathcache.PathCache(10)):
+        oms_root, machines, compute = _setup()
+        path = '/machines/%s' % compute.__name__
+        traverse1(path)
+
+        with mock.patch.object(db.AsyncTransaction, '_begin', begin):
+            d = rename(compute.__name__)
+            # cached again by a concurrent traversal, before the rename is committed
+            traverse1(path)
+            eq_(len(pathcache._cache), 1)
+            pending.callback(None)
+
+        assert d.called
+        eq_(len(pathcache._cache), 0)
+
+
+@run_in_reactor
+@clean_db
+def test_outdated_snapshot_not_cached():
+    with mock.patch.object(pathcache, '_cache', pathcache.PathCache(10)):
+        oms_root, machines, compute = _setup()
+
+        oms_root._p_jar._txn_time = 'tid'
+        try:
+            traverse1('/machines/%s' % compute.__name__)
+        finally:
+            oms_root._p_jar._txn_time = None
+        eq_(len(pathcache._cache), 0)
+
+
+@run_in_reactor
+@clean_db
+def test_canonical_path():
+    oms_root, machines, compute = _setup()
+    name = compute.__name__
+
+    eq_(canonical_path(compute), '/machines/%s' % name)
+    eq_(canonical_path(sudo(compute)), '/machines/%s' % name)
+    eq_(canonical_path(Symlink('link', compute)), '/machines/%s' % name)
+    eq_(canonical_path(oms_root), '')
+    assert canonical_path(compute) is canonical_path(compute)
+
+    machines.rename(name, 'renamed')
+    eq_(canonical_path(compute), '/machines/renamed')
+
+    # moving an ancestor changes the path of its descendants
+    machines.__name__ = 'moved'
+    eq_(canonical_path(compute), '/moved/renamed')
+
+
+def test_lru():
+    cache = pathcache.PathCache(2)
+    for i in range(3):
+        cache.put(('root', (str(i), )), (str(i), ), lambda: True)
+    eq_(cache.get(('root', ('0', ))), None)
+    eq_(len(cache), 2)
+
+    cache.invalidate('root')
+    eq_(len(cache), 0)
+    eq_(cache.keys_by_oid, {})
@@ -0,0 +1,59 @@
+from nose.tools import eq_
+
+from opennode.oms.model.model.base import Model
+from opennode.oms.zodb.proxy import PersistentProxy, CallableViralProxy, make_persistent_proxy
+from opennode.oms.zodb.proxy import get_peristent_context, remove_persistent_proxy
+
+
+class Item(Model):
+
+    def __init__(self):
+        self.name = 'item'
+        self.names = ('a', 1, None)
+        self.children = (Model(),)
+
+    def me(self):
+        return self
+
+
+def test_primitives_are_not_proxied():
+    for value in (None, 'a', u'a', 1, 1L, 1.0, True, Item, ('a', (1, 2.0)), frozenset([1])):
+        assert make_persistent_proxy(value) is value
+
+
+def test_proxy_types():
+    item = Item()
+    assert type(make_persistent_proxy(item)).__bases__ == (PersistentProxy, )
+    assert isinstance(make_persistent_proxy(item.me), CallableViralProxy)
+    assert isinstance(make_persistent_proxy([].__str__), CallableViralProxy)
+    # tuples of objects still need to be proxied
+    assert isinstance(make_persistent_proxy(item.children), PersistentProxy)
+
+
+def test_context_propagation():
+    context = {'x': 1}
+    item = Item()
+    proxy = make_persistent_proxy(item, context)
+
+    assert proxy.names is item.names
+    me = proxy.me()
+    assert remove_persistent_proxy(me) is item
+    assert get_peristent_context(me) is context
+    assert get_peristent_context(item) is context
+    eq_(get_peristent_context(list(proxy.children)[0]), context)
+
+
+def test_context_not_rewritten():
+    context = {}
+    item = Item()
+    make_persistent_proxy(item, context)
+
+    writes = []
+    item.__class__ = type('TracingItem', (Item, ), dict(
+        __setattr__=lambda self, name, value: (writes.append(name), Model.__setattr__(self, name, value))))
+
+    make_persistent_proxy(item, context).name
+    eq_(writes, [])
+
+    make_persistent_proxy(item, {})
+    eq_(writes, ['_v_context'])
@@ -0,0 +1,182 @@
+import json
+
+import mock
+import transaction
+from nose.tools import eq_
+from twisted.internet import task
+from twisted.web.test.requesthelper import DummyRequest
+from zope.authentication.interfaces import IAuthentication
+from zope.component import getUtility
+
+from opennode.oms.endpoint.httprest.root import HttpRestServer, JsonProducer
+from opennode.oms.endpoint.httprest.view import ContainerView
+from opennode.oms.tests.test_compute import Compute
+from opennode.oms.tests.util import run_in_reactor, clean_db
+from opennode.oms.util import JsonSetEncoder
+from opennode.oms.zodb import db
+
+
+def make_request(path, method='GET', args={}, body=''):
+    request = DummyRequest(path.strip('/').split('/'))
+    request.path = path
+    request.method = method
+    request.args = dict((k, [v]) for k, v in args.items())
+    request.content = mock.Mock(getvalue=lambda: body, read=lambda: body)
+    request.getCookie = lambda name: None
+    return request
+
+
+def make_server():
+    auth = getUtility(IAuthentication, context=None)
+    user = auth.getPrincipal('user')
+    if 'admins' not in user.groups:
+        user.groups.append('admins')
+
+    server = HttpRestServer()
+    server.check_auth = lambda request: 'user'
+    return server
+
+
+def handle(request):
+    db.profiler.reset()
+    results = []
+    make_server().handle_request(request).addBoth(results.append)
+    return results[0]
+
+
+class ManualScheduler(object):
+    """Runs the steps of cooperative tasks only when asked to"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, f):
+        self.calls.append(f)
+        return mock.Mock()
+
+    def run(self):
+        while self.calls:
+            self.calls.pop(0)()
+
+
+@run_in_reactor
+@clean_db
+def test_get_is_read_only():
+    res = handle(make_request('/proc/db/threadpools/ro'))
+    eq_(res['id'], 'ro')
+    assert json.dumps(res, indent=2, cls=JsonSetEncoder)
+
+    # only the read-only transaction has been used
+    eq_([p.calls for p in db.profiler.get_profiles() if p.name.endswith('handle_rw_request')], [])
+
+
+@run_in_reactor
+@clean_db
+def test_get_needing_rw_falls_back():
+    from opennode.oms.endpoint.httprest.view import DefaultView
+
+    with mock.patch.object(DefaultView, 'rw_transaction', lambda self, request: True):
+        res = handle(make_request('/proc/db/threadpools/ro'))
+    eq_(res['id'], 'ro')
+    eq_([p.calls for p in db.profiler.get_profiles() if p.name.endswith('handle_rw_request')], [1])
+
+
+@run_in_reactor
+@clean_db
+def test_pack_stats():
+    res = handle(make_request('/proc/db/pack'))
+    eq_(res['running'], False)
+    eq_(res['total_reclaimed'], 0)
+
+
+@run_in_reactor
+@clean_db
+def test_attrs_projection():
+    res = handle(make_request('/proc/db/threadpools/ro', args={'attrs': 'max_threads,url'}))
+    eq_(sorted(res.keys()), ['id', 'max_threads', 'url'])
+
+    res = handle(make_request('/proc/db/threadpools', args={'depth': '1', 'attrs': 'max_threads', 'exclude': 'rw'}))
+    eq_([(child['id'], child['max_threads']) for child in res['children']], [('background', 2), ('ro', 20)])
+
+
+@run_in_reactor
+@clean_db
+def test_pagination():
+    machines = db.get_root()['oms_root']['machines']
+    for i in range(5):
+        machines.add(Compute(u'tux%s' % i, u'active'))
+    names = sorted(machines.listnames())
+    transaction.commit()
+
+    walked = []
+    itercontent = type(machines).itercontent
+
+    def walking(self, after=None):
+        for child in itercontent(self, after):
+            walked.append(child.__name__)
+            yield child
+
+    # only the requested page is rendered, and only the children up to its end are walked
+    with mock.patch.object(ContainerView, 'render_recursive', autospec=True,
+                           side_effect=ContainerView.render_recursive) as render:
+        with mock.patch.object(type(machines), 'itercontent', walking):
+            res = handle(make_request('/machines', args={'depth': '1', 'limit': '2', 'offset': '2'}))
+    eq_([child['id'] for child in res['children']], names[1:3])
+    eq_(res['totalChildren'], len(names))
+    eq_(res['count'], len(names))
+    eq_(render.call_count, 3)
+    eq_(walked, names[:3])
+
+    res = handle(make_request('/machines', args={'depth': '1', 'limit': '2', 'after': names[1]}))
+    eq_([child['id'] for child in res['children']], names[2:4])
+    eq_(res['next'], names[3])
+
+    res = handle(make_request('/machines', args={'depth': '1', 'limit': '2', 'after': names[3]}))
+    eq_([child['id'] for child in res['children']], names[4:])
+    eq_(res['next'], None)
+
+    res = handle(make_request('/machines', args={'depth': '1', 'sort': '-hostname'}))
+    eq_([child['hostname'] for child in res['children']], [u'tux%s' % i for i in reversed(range(5))])
+
+
+@run_in_reactor
+@clean_db
+def test_count():
+    eq_(handle(make_request('/machines'))['count'], 0)
+    # containers computing their content are counted only on request
+    assert 'count' not in handle(make_request('/bin'))
+    res = handle(make_request('/bin', args={'attrs': 'id,count'}))
+    eq_(res['count'], len(db.get_root()['oms_root']['bin'].listnames()))
+
+
+@run_in_reactor
+@clean_db
+def test_compact():
+    request = make_request('/proc/db/threadpools/ro', args={'compact': 'true'})
+    make_server()._render(request)
+
+    body = ''.join(request.written)
+    eq_(json.loads(body)['id'], 'ro')
+    assert ' ' not in body and '\n' not in body
+    eq_(request.outgoingHeaders['content-length'], str(len(body)))
+
+
+def test_json_producer():
+    data = {'id': 'listing', 'children': [{'id': str(i), 'tags': set([u'tag'])} for i in range(100)]}
+    request = DummyRequest([''])
+    request.registerProducer = mock.Mock()
+    request.unregisterProducer = mock.Mock()
+    scheduler = ManualScheduler()
+    # a single step per scheduled call
+    cooperator = task.Cooperator(terminationPredicateFactory=lambda: lambda: True, scheduler=scheduler)
+
+    results = []
+    JsonProducer(request, JsonSetEncoder(indent=2), data, 1000, cooperator).start().addCallback(results.append)
+    eq_(results, [])
+    scheduler.run()
+
+    eq_(results, [True])
+    eq_(''.join(request.written), json.dumps(data, indent=2, cls=JsonSetEncoder))
+    assert len(request.written) > 1
+    assert all(len(chunk) < 2000 for chunk in request.written)
+    assert request.unregisterProducer.called
@@ -0,0 +1,108 @@
+import unittest
+
+from grokcore.component import Adapter, context
+from nose.tools import eq_
+from zope import schema
+from zope.component import provideAdapter, getGlobalSiteManager
+from zope.interface import Interface, implements, alsoProvides, noLongerProvides
+from zope.security.interfaces import Unauthorized
+
+from opennode.oms.model.model.base import Model
+from opennode.oms.model.schema import get_descriptor, get_schemas, get_schema_fields, model_to_dict
+
+
+class IItem(Interface):
+    title = schema.TextLine(title=u"Title")
+
+
+class IExtra(Interface):
+    extra = schema.Int(title=u"Extra")
+
+
+class IFlag(Interface):
+    """Marker"""
+
+
+class Item(Model):
+    implements(IItem)
+
+    def __init__(self, title):
+        self.title = title
+
+
+class SecretItem(Item):
+
+    def __init__(self):
+        pass
+
+    @property
+    def title(self):
+        raise Unauthorized(self, 'title')
+
+
+class ItemExtra(Adapter):
+    implements(IExtra)
+    context(Item)
+
+    extra = 42
+
+
+class SchemaDescriptorTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        getGlobalSiteManager().unregisterAdapter(ItemExtra, (Item, ), IExtra)
+
+    def test_descriptor(self):
+        item = Item(u'item')
+        eq_(get_descriptor(item).schemas, (IItem, ))
+        eq_([name for name, field, schema in get_schema_fields(item)], ['title'])
+        eq_(get_descriptor(item).titles.items(), [('title', u'Title')])
+        assert get_descriptor(item) is get_descriptor(Item(u'other'))
+
+    def test_registry_change(self):
+        item = Item(u'item')
+        eq_(get_schemas(item), [IItem])
+
+        provideAdapter(ItemExtra, adapts=(Item, ), provides=IExtra)
+        eq_(get_schemas(item), [IItem, IExtra])
+        eq_(get_schemas(Item), [IItem, IExtra])
+        eq_(model_to_dict(item)['extra'], 42)
+
+    def test_serializer(self):
+        provideAdapter(ItemExtra, adapts=(Item, ), provides=IExtra)
+        item = Item(u'item')
+
+        eq_(model_to_dict(item).keys(), ['title', 'extra', 'mtime', 'ctime'])
+        eq_(model_to_dict(item, use_titles=True).keys()[:2], [u'Title', u'Extra'])
+        eq_(model_to_dict(item, use_fields=True).keys()[:2], [IItem['title'], IExtra['extra']])
+        eq_(model_to_dict(item, ordered=False), dict(model_to_dict(item)))
+        assert get_descriptor(item).serializer() is get_descriptor(Item(u'other')).serializer()
+
+    def test_projection(self):
+        provideAdapter(ItemExtra, adapts=(Item, ), provides=IExtra)
+        item = Item(u'item')
+
+        eq_(model_to_dict(item, attrs=['title']), {'title': u'item'})
+        eq_(model_to_dict(item, attrs=['extra', 'mtime', 'unknown']).keys(), ['extra', 'mtime'])
+        eq_(model_to_dict(item, attrs=[]), {})
+        assert (get_descriptor(item).serializer(attrs=['title', 'unknown']) is
+                get_descriptor(item).serializer(attrs=('title', )))
+
+    def test_unreadable_projection(self):
+        item = SecretItem()
+        # projecting an unreadable field leaves it out, the whole object is unreadable otherwise
+        eq_(model_to_dict(item, attrs=['title']), {})
+        eq_(model_to_dict(item, attrs=['title', 'mtime']).keys(), ['mtime'])
+        eq_(model_to_dict(item).keys(), ['mtime', 'ctime'])
+
+    def test_markers(self):
+        item = Item(u'item')
+        eq_(item.get_features(), set(['IItem']))
+
+        alsoProvides(item, IFlag)
+        eq_(item.get_features(), set(['IItem', 'IFlag']))
+        eq_(Item(u'other').get_features(), set(['IItem']))
+
+        noLongerProvides(item, IFlag)
+        eq_(item.get_features(), set(['IItem']))
+        eq_(Item.get_class_features(), set(['IItem']))
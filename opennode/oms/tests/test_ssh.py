@@ -77,6 +77,23 @@ class SshTestCase(unittest.TestCase):
             t.write('No such command: non-existent-command\n')
         assert not self.terminal.method_calls[1][1][0].startswith('Command returned an unhandled error')
 
+    @run_in_reactor
+    def test_command_class_cache(self):
+        self._cmd('pwd')
+        self._cmd('non-existent-command')
+
+        # only the commands of /bin are cached
+        eq_(self.oms_ssh.command_classes, {'/bin/pwd': commands()['pwd']})
+        self._cmd('cd /bin')
+        self._cmd('pwd')
+        eq_(sorted(self.oms_ssh.command_classes), ['/bin/cd', '/bin/pwd'])
+
+        # registering commands invalidates the cache
+        self._cmd('cd /')
+        with mock.patch.dict(commands(), {'new-command': commands()['pwd']}):
+            self._cmd('pwd')
+        eq_(self.oms_ssh.command_classes.keys(), ['/bin/pwd'])
+
     @run_in_reactor
     def test_pwd(self):
         self._cmd('pwd')
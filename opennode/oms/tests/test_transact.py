@@ -0,0 +1,134 @@
+import mock
+import transaction
+import ZODB
+from nose.tools import eq_, assert_raises
+from persistent.list import PersistentList
+
+from opennode.oms.tests.test_compute import Compute
+from opennode.oms.tests.util import run_in_reactor, clean_db
+from opennode.oms.zodb import db
+from opennode.oms.zodb.proxy import PersistentProxy
+from opennode.oms.zodb.snapshot import Snapshot, make_snapshot
+
+
+def fired_result(d):
+    results = []
+    d.addBoth(results.append)
+    assert results, "deferred didn't fire synchronously"
+    return results[0]
+
+
+@run_in_reactor
+@clean_db
+def test_ro_transact_runs_in_outer_transaction():
+    @db.ro_transact
+    def read():
+        return db.current_transaction_kind(), db.get_root()['oms_root'].test_value
+
+    @db.transact
+    def outer():
+        db.get_root()['oms_root'].test_value = 'outer'
+        return fired_result(read())
+
+    eq_(fired_result(outer()), ('rw', 'outer'))
+    eq_(db.current_transaction_kind(), None)
+
+
+@run_in_reactor
+@clean_db
+def test_nested_transactions_commit_separately():
+    @db.transact
+    def write():
+        db.get_root()['oms_root'].test_value = 'written'
+
+    @db.transact
+    def outer():
+        # the nested write commits on its own, like the user event log flushes
+        fired_result(write())
+        raise db.RollbackException
+
+    fired_result(outer())
+
+    transaction.abort()
+    eq_(db.get_root()['oms_root'].test_value, 'written')
+
+
+@run_in_reactor
+@clean_db
+def test_ro_transact_does_not_join_writes():
+    @db.transact
+    def write():
+        db.get_root()['oms_root'].test_value = 'written'
+
+    @db.ro_transact
+    def outer():
+        # runs in its own transaction, otherwise the write would be rolled back
+        write()
+
+    fired_result(outer())
+
+    transaction.abort()
+    eq_(db.get_root()['oms_root'].test_value, 'written')
+
+
+@run_in_reactor
+@clean_db
+def test_snapshot():
+    @db.transact(snapshot=True)
+    def add():
+        compute = Compute(u'tux-for-test', u'active')
+        compute.nameservers = PersistentList([u'8.8.8.8'])
+        db.get_root()['oms_root'].test_compute = compute
+        return [compute]
+
+    @db.ro_transact(snapshot=True)
+    def read():
+        return db.get_root()['oms_root'].test_compute
+
+    computes = fired_result(add())
+    assert isinstance(computes, tuple)
+    eq_(computes[0]['hostname'], u'tux-for-test')
+
+    compute = fired_result(read())
+    assert isinstance(compute, Snapshot) and not isinstance(compute, PersistentProxy)
+    eq_(compute['state'], u'active')
+    eq_(compute['nameservers'], (u'8.8.8.8', ))
+    eq_(compute.keys()[0], '__name__')
+    with assert_raises(TypeError):
+        compute['state'] = u'inactive'
+
+
+def test_snapshot_of_computed_values():
+    class Computed(object):
+        """Builds new models on access, they are freed as soon as they are snapshotted"""
+
+        def __iter__(self):
+            return (Compute(u'tux%s' % i, u'active') for i in range(10))
+
+        def __getitem__(self, i):
+            return Compute(u'tux%s' % i, u'active')
+
+    eq_([compute['hostname'] for compute in make_snapshot(Computed())], [u'tux%s' % i for i in range(10)])
+
+
+@run_in_reactor
+@clean_db
+def test_readonly_replica():
+    replica = ZODB.DB(db.get_db().storage)
+
+    @db.ro_transact(proxy=False)
+    def read():
+        return db.get_connection().db(), db.get_root()['oms_root'].__class__
+
+    @db.transact
+    def write():
+        return db.get_connection().db() is db.get_db()
+
+    try:
+        with mock.patch.object(db, '_ro_db', replica):
+            database, root_class = fired_result(read())
+            assert database is replica
+            eq_(root_class.__name__, 'OmsRoot')
+            assert fired_result(write()) is True
+    finally:
+        del db._connection.ro
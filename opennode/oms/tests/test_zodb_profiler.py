@@ -0,0 +1,142 @@
+import mock
+import unittest
+
+from nose.tools import eq_
+from ZODB.POSException import ConflictError, ReadConflictError
+
+from opennode.oms.model.model.proc import Proc
+from opennode.oms.tests.util import run_in_reactor, clean_db
+from opennode.oms.zodb import db
+from opennode.oms.zodb.profiler import TransactionProfiler, Histogram, profiler
+from opennode.oms.zodb.stats import DbStats, TransactionStats
+
+
+def conflict(cls, oid, class_name=None):
+    e = cls(oid=oid)
+    e.class_name = class_name
+    return e
+
+
+class TransactionProfilerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.profiler = TransactionProfiler()
+
+    def test_histogram(self):
+        h = Histogram()
+        for value in (0.0005, 0.002, 0.002, 10):
+            h.add(value)
+
+        eq_(h.count, 4)
+        eq_(h.max, 10)
+        eq_(h.as_dict()['<=0.005'], 2)
+        eq_(h.as_dict()['>5.0'], 1)
+
+    def test_profile_per_code(self):
+        profiles = [self.profiler.profile_for(lambda: None, 'rw') for i in range(3)]
+        assert profiles[0] is profiles[1] is profiles[2]
+
+        def fun():
+            pass
+        other = self.profiler.profile_for(fun, 'ro')
+        assert other is not profiles[0]
+        eq_(other.id, 'fun-ro')
+
+    def test_conflicts(self):
+        def fun():
+            pass
+        profile = self.profiler.profile_for(fun, 'rw')
+
+        self.profiler.record_conflict(profile, conflict(ConflictError, '\0' * 7 + '\1', 'Foo'), read=False)
+        self.profiler.record_conflict(profile, conflict(ReadConflictError, '\0' * 7 + '\1'), read=True)
+        self.profiler.record(profile, 0.1, commit=0.05, committed=True)
+
+        eq_(profile.retries, 2)
+        eq_(profile.commits, 1)
+
+        report = self.profiler.report()
+        eq_(len(report['transactions']), 1)
+        eq_(sorted((i['oid'], i['class_name'], i['read_conflicts'], i['write_conflicts'])
+                   for i in report['conflicts']),
+            [('0x01', 'Foo', 1, 1)])
+
+        self.profiler.reset()
+        eq_(self.profiler.report(), dict(transactions=[], conflicts=[], hotspots=[]))
+
+    def test_hotspots(self):
+        def fun():
+            pass
+        profile = self.profiler.profile_for(fun, 'rw')
+
+        with mock.patch('time.time', return_value=1000):
+            self.profiler.record_conflict(profile, conflict(ConflictError, '\0' * 7 + '\1', 'Old'), read=False)
+        with mock.patch('time.time', return_value=1350):
+            for i in range(2):
+                self.profiler.record_conflict(profile, conflict(ConflictError, '\0' * 7 + '\2', 'Hot'),
+                                              read=False)
+            self.profiler.record_conflict(profile, conflict(ConflictError, '\0' * 7 + '\1', 'Old'), read=False)
+
+            eq_([(i.class_name, i.recent_conflicts) for i in self.profiler.hotspots()], [('Hot', 2), ('Old', 1)])
+
+        with mock.patch('time.time', return_value=1700):
+            eq_(self.profiler.hotspots(), [])
+        eq_(sum(i.write_conflicts for i in self.profiler.get_conflicts()), 4)
+
+
+@run_in_reactor
+@clean_db
+def test_transact_is_profiled():
+    attempts = []
+
+    @db.transact
+    def conflicting():
+        attempts.append(None)
+        if len(attempts) == 1:
+            raise conflict(ConflictError, '\0' * 7 + '\2', 'Compute')
+        return len(attempts)
+
+    # conflicts raised inside the function body are not retried
+    conflicting().addErrback(lambda f: f.trap(ConflictError))
+    results = []
+    conflicting().addCallback(results.append)
+    eq_(results, [2])
+
+    transactions = DbStats()['transactions']
+    stats = [i for i in transactions.listcontent() if i.name.endswith('.conflicting')]
+    eq_(len(stats), 1)
+    assert isinstance(stats[0], TransactionStats)
+    eq_(stats[0].calls, 2)
+    eq_(stats[0].errors, 1)
+    eq_(stats[0].commits, 1)
+
+    # the source line is looked up only when tracing is enabled
+    eq_(profiler.get_profile(stats[0].__name__)._lineno, None)
+    assert 'db' in Proc().content()
+
+
+def test_conflict_backoff():
+    for attempt in range(20):
+        assert 0 <= db.conflict_backoff(attempt) <= 1.0
+
+    with mock.patch('random.uniform', side_effect=lambda a, b: b):
+        eq_([db.conflict_backoff(i) for i in range(3)], [0.01, 0.02, 0.04])
+
+
+@run_in_reactor
+@clean_db
+def test_retry_budget():
+    @db.transact(retries=2)
+    def budgeted():
+        pass
+
+    with mock.patch('transaction.commit', side_effect=conflict(ConflictError, '\0' * 7 + '\3', 'Search')):
+        with mock.patch('time.sleep') as sleep:
+            budgeted().addErrback(lambda f: f.trap(ConflictError))
+
+    # no point in sleeping after the last attempt
+    eq_(sleep.call_count, 2)
+    profile = [i for i in profiler.get_profiles() if i.name.endswith('.budgeted')][0]
+    # the last conflict isn't retried
+    eq_(profile.retries, 2)
+    eq_(profile.write_conflicts, 3)
+    eq_(profile.exhausted, 1)
@@ -0,0 +1,126 @@
+import threading
+import time
+import unittest
+
+from nose.tools import eq_
+
+from opennode.oms.zodb import db
+from opennode.oms.zodb.threadpool import MeteredThreadPool, INTERACTIVE, NORMAL, BACKGROUND
+
+
+class MeteredThreadPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = MeteredThreadPool(minthreads=0, maxthreads=1, name='test')
+
+    def tearDown(self):
+        self.pool.stop()
+
+    def test_queue_metrics(self):
+        release = threading.Event()
+        done = threading.Event()
+
+        self.pool.callInThreadWithCallback(None, release.wait, 5)
+        self.pool.callInThreadWithCallback(lambda success, result: done.set(), lambda: None)
+
+        eq_(self.pool.stats()['submitted'], 2)
+        eq_(self.pool.stats()['queued'], 2)
+
+        self.pool.start()
+        release.set()
+        assert done.wait(5)
+
+        stats = self.pool.stats()
+        eq_(stats['started'], 2)
+        eq_(stats['completed'], 2)
+        eq_(stats['queued'], 0)
+        assert stats['wait_max'] >= stats['wait_avg'] > 0
+
+    def test_reset_stats(self):
+        done = threading.Event()
+        self.pool.start()
+        self.pool.callInThreadWithCallback(lambda success, result: done.set(), lambda: None)
+        assert done.wait(5)
+
+        self.pool.reset_stats()
+        eq_(self.pool.stats()['completed'], 0)
+        eq_(self.pool.stats()['wait_avg'], 0.0)
+
+    def test_priority_order(self):
+        done = threading.Event()
+        order = []
+
+        for priority in (BACKGROUND, NORMAL, INTERACTIVE, NORMAL):
+            self.pool.callInThreadWithPriority(priority, None, order.append, priority)
+        self.pool.callInThreadWithPriority(BACKGROUND, lambda success, result: done.set(), lambda: None)
+
+        eq_(self.pool.queued_with_priority(NORMAL), 2)
+
+        self.pool.start()
+        assert done.wait(5)
+        eq_(order, [INTERACTIVE, NORMAL, NORMAL, BACKGROUND])
+
+    def test_background_yields(self):
+        done = threading.Event()
+        pending = [True]
+
+        def yield_to():
+            # the background job is held back until the interactive work is gone
+            pending.append(False)
+            return pending.pop(0)
+
+        self.pool.yield_to = yield_to
+        self.pool.start()
+        self.pool.callInThreadWithPriority(BACKGROUND, lambda success, result: done.set(), lambda: None)
+        assert done.wait(5)
+
+        eq_(self.pool.stats()['yielded'], 1)
+
+    def test_yielding_job_frees_the_worker(self):
+        background_done = threading.Event()
+        interactive_done = threading.Event()
+
+        self.pool.yield_to = lambda: not interactive_done.is_set()
+        self.pool.max_yield = 5
+        self.pool.start()
+        self.pool.callInThreadWithPriority(BACKGROUND, lambda success, result: background_done.set(), lambda: None)
+        time.sleep(0.05)
+
+        # the only worker isn't kept busy by the yielding background job
+        self.pool.callInThreadWithPriority(INTERACTIVE, lambda success, result: interactive_done.set(), lambda: None)
+        assert interactive_done.wait(1)
+        assert background_done.wait(5)
+        eq_(self.pool.stats()['completed'], 2)
+
+    def test_yielding_job_fails_on_stop(self):
+        results = []
+        yielded = threading.Event()
+
+        def yield_to():
+            yielded.set()
+            return True
+
+        self.pool.yield_to = yield_to
+        self.pool.max_yield = 5
+        self.pool.yield_interval = 1
+        self.pool.start()
+        self.pool.callInThreadWithPriority(BACKGROUND, lambda success, result: results.append(success),
+                                           lambda: None)
+        assert yielded.wait(1)
+
+        self.pool.stop()
+        eq_(results, [False])
+        eq_(self.pool.queued_with_priority(BACKGROUND), 0)
+
+
+def test_separate_threadpools():
+    pools = db.get_threadpools()
+    eq_(sorted(pools.keys()), sorted(db.THREADPOOLS))
+    assert pools['ro'] is not pools['rw']
+    assert db.get_threadpool('background') is pools['background']
+
+
+def test_priority_classes():
+    eq_(db.get_priority('ro'), NORMAL)
+    eq_(db.get_priority('background'), BACKGROUND)
+    eq_(db.get_priority('rw', 'interactive'), INTERACTIVE)
@@ -0,0 +1,72 @@
+import threading
+import time
+
+import mock
+from nose.tools import eq_
+
+from opennode.oms.model.model.base import Container, Model
+from opennode.oms.tests.util import run_in_reactor, clean_db
+from opennode.oms.zodb import db, warmup
+
+
+class Item(Model):
+    pass
+
+
+class Items(Container):
+    __contains__ = Item
+
+
+def test_rendezvous():
+    rendezvous = warmup.Rendezvous(3, time.time() + 5)
+    threads = set()
+
+    def job():
+        threads.add(threading.currentThread())
+        rendezvous.wait()
+
+    workers = [threading.Thread(target=job) for i in range(3)]
+    for i in workers:
+        i.start()
+    for i in workers:
+        i.join(5)
+    eq_(len(threads), 3)
+    assert not any(i.isAlive() for i in workers)
+
+
+def test_rendezvous_deadline():
+    rendezvous = warmup.Rendezvous(2, time.time() + 0.05)
+    rendezvous.wait()
+    eq_(rendezvous.arrived, 1)
+
+
+@run_in_reactor
+@clean_db
+def test_warm_up():
+    @db.transact
+    def populate():
+        items = Items()
+        items.__name__ = 'items'
+        for i in range(3):
+            items.add(Item())
+        db.get_root()['oms_root']._items['items'] = items
+    populate()
+
+    results = []
+    with mock.patch.object(warmup, 'get_config') as get_config:
+        get_config.return_value.getstring.return_value = '/items, /missing'
+        get_config.return_value.getint.return_value = 1
+        get_config.return_value.getfloat.return_value = 10
+        warmup.warm_up().addBoth(results.append)
+    eq_(results, [1])
+
+    eq_(warmup._warm_up_connection(['/items'], 0, time.time() + 10, None), 1)
+    eq_(warmup._warm_up_connection(['/items'], 1, time.time() + 10, None), 4)
+    eq_(warmup._warm_up_connection(['/items'], 1, time.time() - 1, None), None)
+
+
+def test_db_options():
+    options = db.get_db_options()
+    eq_(options['pool_size'], 32)
+    eq_(options['cache_size'], 10000)
+    eq_(options['cache_size_bytes'], 0)
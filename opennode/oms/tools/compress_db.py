@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""Rewrites the whole database compressing (or decompressing) all the records.
+
+OMS and the ZEO server have to be stopped. The original database is kept as
+`data.fs.orig` and its blobs in the `.orig` blob directory; set `[db] compression`
+accordingly before restarting OMS.
+
+"""
+import argparse
+import os
+
+from ZODB.FileStorage import FileStorage
+
+from opennode.oms.config import get_config, get_config_cmdline
+
+
+def rewrite(path, blob_dir=None, decompress=False):
+    """Copies all the transactions (and blobs, when `blob_dir` exists) of the FileStorage at `path`
+    into a new one, then swaps them"""
+    from zc.zlibstorage import ZlibStorage
+
+    if blob_dir is not None and not os.path.isdir(blob_dir):
+        blob_dir = None
+
+    new_path = path + '.new'
+    new_blob_dir = blob_dir + '.new' if blob_dir else None
+    for leftover in (new_path, new_blob_dir):
+        if leftover and os.path.exists(leftover):
+            raise Exception("%s exists, remove it if it's a leftover of an interrupted run" % leftover)
+    if blob_dir and os.path.exists(blob_dir + '.orig'):
+        raise Exception("%s.orig exists, remove the blobs of the previous run first" % blob_dir)
+
+    # the wrapper decompresses the records read through it, whether they are compressed or not,
+    # and compresses those written through it unless told otherwise
+    source = ZlibStorage(FileStorage(path, read_only=True, blob_dir=blob_dir))
+    target = ZlibStorage(FileStorage(new_path, create=True, blob_dir=new_blob_dir), compress=not decompress)
+    try:
+        target.copyTransactionsFrom(source)
+    finally:
+        target.close()
+        source.close()
+
+    os.rename(path, path + '.orig')
+    os.rename(new_path, path)
+    if blob_dir:
+        os.rename(blob_dir, blob_dir + '.orig')
+        os.rename(new_blob_dir, blob_dir)
+    # replaces the index of the original database
+    os.rename(new_path + '.index', path + '.index')
+    for ext in ('.lock', '.tmp'):
+        if os.path.exists(new_path + ext):
+            os.unlink(new_path + ext)
+
+
+def run():
+    parser = argparse.ArgumentParser(description='Compress the records of the OMS database')
+    parser.add_argument('--db', help='overrides db directory')
+    parser.add_argument('-d', action='store_true', help='decompress the records instead')
+    args = parser.parse_args()
+
+    if args.db:
+        conf = get_config_cmdline()
+        if not conf.has_section('db'):
+            conf.add_section('db')
+        conf.set('db', 'path', args.db)
+
+    from opennode.oms.zodb.db import get_blob_dir
+    path = os.path.join(get_config().get('db', 'path'), 'data.fs')
+    before = os.path.getsize(path)
+    rewrite(path, blob_dir=get_blob_dir(), decompress=args.d)
+    print "%s: %s bytes -> %s bytes" % (path, before, os.path.getsize(path))
+
+
+if __name__ == "__main__":
+    run()
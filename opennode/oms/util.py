@@ -6,8 +6,9 @@ import threading
 
 from Queue import Queue, Empty
 
+import grokcore.component.util
 import zope.interface
-from zope.component import getSiteManager, implementedBy
+from zope.component import getGlobalSiteManager, getSiteManager, implementedBy
 from zope.interface import classImplements
 from twisted.internet import defer, reactor
 from twisted.python import log
@@ -64,6 +65,58 @@ def query_adapter_for_class(cls, interface):
     return getSiteManager().adapters.lookup([implementedBy(cls)], interface)
 
 
+# {(kind, provided spec, interface): (registry, registry generation, factories)}
+_lookup_cache = {}
+_sort_keys = {}
+
+
+def _lookup(kind, spec, interface):
+    """Returns the subscription factories or the adapter factory registered for `spec`.
+
+    Entries are stamped with the generation of the registry, which changes whenever a component
+    is (un)registered, e.g. when grokking plugins, so stale entries are just looked up again.
+    """
+    registry = getGlobalSiteManager().adapters
+    key = (kind, spec, interface)
+    entry = _lookup_cache.get(key)
+    if entry is None or entry[0] is not registry or entry[1] != registry._generation:
+        if kind == 'subscriptions':
+            factories = tuple(registry.subscriptions((spec, ), interface))
+        else:
+            factories = registry.lookup((spec, ), interface)
+        entry = _lookup_cache[key] = (registry, registry._generation, factories)
+    return entry[2]
+
+
+def _sort_key(subscription):
+    cls = type(subscription)
+    key = _sort_keys.get(cls)
+    if key is None:
+        key = _sort_keys[cls] = grokcore.component.util._sort_key(subscription)
+    return key
+
+
+def query_subscriptions(obj, interface, ordered=False):
+    """Cached equivalent of grok `querySubscriptions` (or `queryOrderedSubscriptions` when
+    `ordered` is set)."""
+    factories = _lookup('subscriptions', zope.interface.providedBy(obj), interface)
+    subscriptions = [s for s in (factory(obj) for factory in factories) if s is not None]
+    if ordered:
+        subscriptions.sort(key=_sort_key)
+    return subscriptions
+
+
+def query_adapter(obj, interface, default=None):
+    """Cached equivalent of `interface(obj, default)` for adapters registered in the registry."""
+    spec = zope.interface.providedBy(obj)
+    if spec.isOrExtends(interface):
+        return obj
+
+    factory = _lookup('adapter', spec, interface)
+    adapter = factory(obj) if factory is not None else None
+    return adapter if adapter is not None else default
+
+
 class Singleton(type):
     """Singleton metaclass."""
 
@@ -297,7 +350,7 @@ def timeout(secs):
 
 class JsonSetEncoder(json.JSONEncoder):
     def default(self, obj):
-        if isinstance(obj, set):
+        if isinstance(obj, (set, frozenset)):
             return list(obj)
         if hasattr(obj, '__str__'):
             return str(obj)
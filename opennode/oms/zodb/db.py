@@ -1,40 +1,58 @@
+import atexit
 import functools
 import inspect
 import logging
+import os
 import random
+import shutil
 import subprocess
+import tempfile
 import threading
 import time
 import transaction
 
 from ZEO.ClientStorage import ClientStorage
 from ZODB.FileStorage import FileStorage
+from ZODB.MappingStorage import MappingStorage
+from ZODB.blob import BlobStorage
 from ZODB.POSException import ConflictError, ReadConflictError, StorageTransactionError
 from grokcore.component import subscribe
-from twisted.internet import reactor, defer
+from twisted.internet import reactor, defer, task
 from twisted.internet.threads import deferToThreadPool
+from twisted.python.failure import Failure
 from twisted.python.threadable import isInIOThread
-from twisted.python.threadpool import ThreadPool
 from zope.component import handle
 from zope.interface import Interface, implements
 
 from opennode.oms.config import get_config
 from opennode.oms.core import IBeforeApplicationInitializedEvent
 from opennode.oms.model.model import OmsRoot
+from opennode.oms.model.model.base import count_children
 from opennode.oms.zodb.proxy import (make_persistent_proxy,
                                      remove_persistent_proxy as _remove_persistent_proxy,
                                      get_peristent_context, PersistentProxy)
 from opennode.oms.zodb.extractors import context_from_method
+from opennode.oms.zodb.profiler import profiler
+from opennode.oms.zodb.snapshot import make_snapshot
+from opennode.oms.zodb.threadpool import MeteredThreadPool, PRIORITIES, INTERACTIVE
 
 
-__all__ = ['get_db', 'get_connection', 'get_root', 'transact', 'ref', 'deref']
+__all__ = ['get_db', 'get_connection', 'get_root', 'transact', 'async_transact', 'ro_transact', 'ref', 'deref']
 
 
+# Separate pools so that slow writes (or background jobs) cannot starve interactive reads:
+#  * ``ro`` serves @ro_transact
+#  * ``rw`` serves @transact
+#  * ``background`` serves daemons (indexer, packer, event log flushing, ...)
+THREADPOOLS = ('ro', 'rw', 'background')
+
 _db = None
-_threadpool = None
+_ro_db = None
+_threadpools = {}
 _connection = threading.local()
 _testing = False
 _context = threading.local()
+_running = threading.local()
 
 
 log = logging.getLogger(__name__)
@@ -58,12 +76,64 @@ class BeforeDatabaseInitalizedEvent(object):
 
 
 def init_threadpool():
-    global _threadpool
+    cfg = get_config()
+
+    for name in THREADPOOLS:
+        if name in _threadpools:
+            continue
+
+        maxthreads = cfg.getint('db', '%s_threads' % name, 20)
+        pool = MeteredThreadPool(minthreads=0, maxthreads=maxthreads, name='zodb-%s' % name,
+                                 yield_to=interactive_work_pending,
+                                 max_yield=cfg.getfloat('db', 'background_max_yield', 1.0))
+        _threadpools[name] = pool
+
+        reactor.callWhenRunning(pool.start)
+        reactor.addSystemEventTrigger('during', 'shutdown', pool.stop)
+
+
+def get_threadpool(name):
+    if not _threadpools:
+        init_threadpool()
+
+    if name not in _threadpools:
+        raise Exception("Unknown zodb threadpool '%s'" % name)
+    return _threadpools[name]
 
-    _threadpool = ThreadPool(minthreads=0, maxthreads=20)
 
-    reactor.callWhenRunning(_threadpool.start)
-    reactor.addSystemEventTrigger('during', 'shutdown', _threadpool.stop)
+def get_threadpools():
+    if not _threadpools:
+        init_threadpool()
+    return dict(_threadpools)
+
+
+def interactive_work_pending():
+    return any(pool.queued_with_priority(INTERACTIVE) for pool in _threadpools.values())
+
+
+def get_priority(pool, priority=None):
+    """Returns the numeric priority for a given priority class name.
+    Jobs in the background pool default to background priority, all others to normal."""
+    if priority is None:
+        priority = 'background' if pool == 'background' else 'normal'
+
+    if priority not in PRIORITIES:
+        raise Exception("Unknown zodb job priority '%s'" % priority)
+    return PRIORITIES[priority]
+
+
+def defer_to_threadpool(pool, priority, f, *args, **kwargs):
+    """Like twisted `deferToThreadPool` but honours the priority class of the job."""
+    d = defer.Deferred()
+
+    def onResult(success, result):
+        if success:
+            reactor.callFromThread(d.callback, result)
+        else:
+            reactor.callFromThread(d.errback, result)
+
+    get_threadpool(pool).callInThreadWithPriority(priority, onResult, f, *args, **kwargs)
+    return d
 
 
 def get_db_dir():
@@ -86,7 +156,7 @@ def initialize_database(event):
 
 
 def init(test=False):
-    global _db, _testing
+    global _db, _ro_db, _testing
 
     if _db and not test:
         return
@@ -94,36 +164,114 @@ def init(test=False):
     log.info("Initializing zodb")
     handle(BeforeDatabaseInitalizedEvent())
 
+    profiler.window = get_config().getint('db', 'conflict_report_window', profiler.window)
+
     if not test:
         storage_type = get_config().get('db', 'storage_type')
 
         if storage_type == 'zeo':
             from ZODB import DB
-            storage = ClientStorage('%s/socket' % get_db_dir())
-            _db = DB(storage)
+            # the zeo server runs on the same host, see `daemon.run_zeo`
+            storage = ClientStorage('%s/socket' % get_db_dir(), blob_dir=get_blob_dir(), shared_blob_dir=True,
+                                    **get_zeo_options())
+            _db = DB(wrap_storage(storage), **get_db_options())
         elif storage_type == 'embedded':
             from ZODB import DB
-            storage = FileStorage('%s/data.fs' % get_db_dir())
-            _db = DB(storage)
+            storage = FileStorage('%s/data.fs' % get_db_dir(), blob_dir=get_blob_dir())
+            _db = DB(wrap_storage(storage), **get_db_options())
         elif storage_type == 'memory':
-            from ZODB.tests.util import DB
-            _db = DB()
+            from ZODB import DB
+            _db = DB(get_memory_storage(), **get_db_options())
         else:
             raise Exception("Unknown storage type '%s'" % storage_type)
     else:
-        from ZODB.tests.util import DB
-        _db = DB()
+        from ZODB import DB
+        _db = DB(get_memory_storage())
         _testing = True
 
     init_schema()
 
+    if not test and storage_type == 'zeo' and get_config().getboolean('db', 'zeo_readonly_replica', False):
+        # opened only after the schema is created, a read-only storage cannot create the root object
+        from ZODB import DB
+        address = get_config().getstring('db', 'zeo_readonly_address', '')
+        if address:
+            # blobs are downloaded from a remote server into a local cache
+            blob_options = dict(blob_dir=get_blob_dir() + '-ro-cache')
+        else:
+            address = '%s/socket' % get_db_dir()
+            blob_options = dict(blob_dir=get_blob_dir(), shared_blob_dir=True)
+        storage = ClientStorage(address, read_only=True, **dict(get_zeo_options('-ro'), **blob_options))
+        _ro_db = DB(wrap_storage(storage), **get_db_options())
+
+
+def get_db_options():
+    """Sizes of the connection pool and of the object cache of each connection.
+    Every db thread keeps its own connection, so the cache memory is multiplied by
+    the total number of threads."""
+    cfg = get_config()
+    threads = sum(cfg.getint('db', '%s_threads' % name, 20) for name in THREADPOOLS)
+    return dict(pool_size=threads,
+                cache_size=cfg.getint('db', 'cache_size', 400),
+                cache_size_bytes=cfg.getint('db', 'cache_size_bytes', 0))
+
+
+def get_blob_dir():
+    return get_config().getstring('db', 'blob_dir', '') or os.path.join(get_db_dir(), 'blobs')
+
+
+def get_memory_storage():
+    """In-RAM storage supporting blobs, whose files are kept in a temporary directory"""
+    blob_dir = tempfile.mkdtemp(prefix='oms-blobs-')
+    atexit.register(shutil.rmtree, blob_dir, True)
+    return BlobStorage(blob_dir, MappingStorage())
+
+
+def get_compression():
+    compression = get_config().getstring('db', 'compression', 'none')
+    if compression not in ('zlib', 'none'):
+        raise Exception("Unknown zodb compression '%s'" % compression)
+    return compression
+
+
+def wrap_storage(storage):
+    """Wraps the storage with the one compressing the records, according to `[db] compression`.
+
+    Records are compressed on the client side, so that they cross the ZEO socket compressed too.
+    The storage is wrapped even when compression is off, so that records written compressed stay
+    readable whatever the setting; see `opennode.oms.tools.compress_db` for rewriting existing
+    databases.
+    """
+    from zc.zlibstorage import ZlibStorage
+    return ZlibStorage(storage, compress=get_compression() == 'zlib')
+
+
+def get_zeo_options(suffix=''):
+    """Options of the ZEO client cache. When `[db] zeo_cache_name` is set, the cache is kept
+    on disk and survives restarts. Each storage needs its own cache, thus the `suffix`."""
+    cfg = get_config()
+    options = dict(cache_size=cfg.getint('db', 'zeo_cache_size', 20 * 1024 * 1024))
+    name = cfg.getstring('db', 'zeo_cache_name', '')
+    if name:
+        options.update(client=name + suffix, var=cfg.getstring('db', 'zeo_cache_dir', '') or get_db_dir())
+    return options
+
 
 def init_schema():
     root = get_root(True)
 
     if 'oms_root' not in root:
         root['oms_root'] = OmsRoot()
+        root['oms_container_counters'] = True
+        transaction.commit()
+
+    # databases created before the containers had children counters
+    if not root.get('oms_container_counters'):
+        log.info("Adding the children counters to the containers")
+        updated = count_children(root['oms_root'])
+        root['oms_container_counters'] = True
         transaction.commit()
+        log.info("Added the children counters to %s containers", updated)
 
 
 def get_db():
@@ -139,6 +287,12 @@ def get_connection(accept_main_thread=False):
         raise Exception('The ZODB should not be accessed from the main thread')
 
     global _connection
+    if _ro_db is not None and current_transaction_kind() == 'ro':
+        # readonly transactions use the replica storage, see `[db] zeo_readonly_replica`
+        if not hasattr(_connection, 'ro'):
+            _connection.ro = _ro_db.open()
+        return _connection.ro
+
     if not hasattr(_connection, 'x'):
         _connection.x = get_db().open()
     return _connection.x
@@ -162,14 +316,66 @@ def assert_transact(fun):
     return wrapper
 
 
-def transact(fun):
+def current_transaction_kind():
+    """Returns 'rw' or 'ro' if the current thread is running a `transact` or `ro_transact` function."""
+    return getattr(_running, 'kind', None)
+
+
+def _run_in_transaction(kind, f, *args, **kwargs):
+    previous = current_transaction_kind()
+    _running.kind = kind
+    try:
+        return f(*args, **kwargs)
+    finally:
+        _running.kind = previous
+
+
+def transact(fun=None, pool='rw', priority=None, retries=None, snapshot=False):
+    if fun is None:
+        def wrapper(fun):
+            return _transact(fun, pool, priority, retries, snapshot)
+        return wrapper
+    return _transact(fun, pool, priority, retries, snapshot)
+
+
+def conflict_backoff(attempt):
+    """Returns how long to sleep before retrying a conflicting transaction for the `attempt`-th time.
+
+    The delay grows exponentially up to `[db] conflict_backoff_max` and is fully jittered, so that
+    transactions which conflicted with each other don't collide again at their next attempt.
+    """
+    cfg = get_config()
+    base = cfg.getfloat('db', 'conflict_backoff_base', 0.01)
+    cap = cfg.getfloat('db', 'conflict_backoff_max', 1.0)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _transact(fun, pool='rw', priority=None, retries=None, snapshot=False):
     """Runs a callable inside a separate thread within a ZODB transaction.
 
+    The thread is taken from the `pool` threadpool (see `THREADPOOLS`); daemons should
+    use `pool='background'` so that they don't compete with interactive requests.
+
+    `priority` is one of 'interactive', 'normal' or 'background' and decides the order in
+    which queued jobs are picked up; code serving users directly (ssh, rest) should use 'interactive'.
+
+    On conflicts the transaction is retried up to `retries` times (default: `[db] conflict_retries`),
+    waiting a random exponential backoff (see `conflict_backoff`) between attempts. Functions which
+    are cheap to fail, or which conflict by design, should use a smaller budget.
+
     Returned values are deeply copied. Currently only zodb objects returned directly or
     contained in the first level content of lists/sets/dicts are copied.
+
+    With `snapshot=True` the returned value is instead converted to plain data after the commit
+    (see `opennode.oms.zodb.snapshot`), so that it can be used without proxies in the reactor thread.
     """
-    if not _threadpool:
-        init_threadpool()
+    if retries is not None and retries < 0:
+        raise Exception("Invalid number of conflict retries %s" % retries)
+
+    get_threadpool(pool)
+    priority = get_priority(pool, priority)
+
+    profile = profiler.profile_for(fun, 'rw')
 
     @functools.wraps(fun)
     def run_in_tx(fun, *args, **kwargs):
@@ -180,33 +386,40 @@ def transact(fun):
         _context.x = context
 
         cfg = get_config()
+        tracing = cfg.getboolean('debug', 'trace_transactions', False)
 
         def trace(msg, t, force=False):
-            ch = '/'
-            if msg == "BEGINNING":
-                ch = '\\'
-            if cfg.getboolean('debug', 'trace_transactions', False) or force:
+            # formatting the trace (and looking up the source line) is way more expensive
+            # than the transaction bookkeeping itself, don't do it unless it will be logged
+            if tracing or force:
                 trace_fun = log.error
-            else:
+            elif log.isEnabledFor(logging.DEBUG):
                 trace_fun = log.debug
-            trace_fun("%s\ttx:%s %s\tin %s from %s, line %s %s" %
-                      (msg, t.description, ch, fun, fun.__module__, inspect.getsourcelines(fun)[1], ch))
+            else:
+                return
+            ch = '\\' if msg == "BEGIN" else '/'
+            trace_fun("%s\ttx:%s %s\tin %s from %s, line %s %s",
+                      msg, t.description, ch, fun, fun.__module__, profile.lineno, ch)
 
-        retries = cfg.getint('db', 'conflict_retries')
+        max_retries = retries if retries is not None else cfg.getint('db', 'conflict_retries')
 
+        started = time.time()
         retrying = False
-        for i in xrange(0, retries + 1):
+        for i in xrange(0, max_retries + 1):
             try:
                 t = transaction.begin()
-                t.note("%s" % (random.randint(0, 1000000)))
+                if tracing:
+                    t.note("%s" % (random.randint(0, 1000000)))
                 trace("BEGIN", t)
                 result = fun(*args, **kwargs)
             except RollbackException:
                 transaction.abort()
+                profiler.record(profile, time.time() - started)
                 return
             except:
                 trace("ROLLBACK ON ERROR", t)
                 transaction.abort()
+                profiler.record(profile, time.time() - started, error=True)
                 raise
             else:
                 try:
@@ -214,66 +427,261 @@ def transact(fun):
                         trace("ROLLBACK", t)
                         result = result.value
                         transaction.abort()
+                        profiler.record(profile, time.time() - started)
                     else:
                         trace("COMMIT", t)
+                        commit_started = time.time()
                         transaction.commit()
+                        committed = time.time()
+                        profiler.record(profile, committed - started, commit=committed - commit_started,
+                                        committed=True)
                         if retrying:
                             trace("Succeeded commit, after %s attempts" % i, t)
 
                     _context.x = None
+                    if snapshot:
+                        return make_snapshot(result)
                     return make_persistent_proxy(result, context)
                 except ReadConflictError as e:
+                    profiler.record_conflict(profile, e, read=True, retried=i < max_retries)
                     trace("GOT READ CONFLICT IN RW TRANSACT, retrying %s" % i, t, force=True)
                     retrying = True
-                    time.sleep(random.random() * 0.2)
+                    if i < max_retries:
+                        time.sleep(conflict_backoff(i))
                 except ConflictError as e:
+                    profiler.record_conflict(profile, e, read=False, retried=i < max_retries)
                     trace("GOT WRITE CONFLICT IN RW TRANSACT, retrying %s" % i, t, force=True)
                     retrying = True
-                    time.sleep(random.random() * 0.2)
+                    if i < max_retries:
+                        time.sleep(conflict_backoff(i))
                 except StorageTransactionError as e:
                     if e.args and e.args[0] == "Duplicate tpc_begin calls for same transaction":
                         # This may happen when an object attached to one connection is used in anther
                         # connection's transaction. Check and compare _p_jar attributes of all objects
                         # involved in this transaction! They all must be the same.
                         trace("DUPLICATE tpc_begin IN RW TRANSACT", t, force=True)
+                    profiler.record(profile, time.time() - started, error=True)
                     raise
                 except:
                     trace('ABORT: bad commit attempt', t)
                     transaction.abort()
+                    profiler.record(profile, time.time() - started, error=True)
                     raise
+        log.warning("Giving up %s after %s conflicting attempts", profile.name, max_retries + 1)
+        profiler.record(profile, time.time() - started, error=True, exhausted=True)
         raise e
 
     @functools.wraps(fun)
     def wrapper(*args, **kwargs):
         if not _testing:
-            return deferToThreadPool(reactor, _threadpool,
-                                     run_in_tx, fun, *args, **kwargs)
+            return defer_to_threadpool(pool, priority, _run_in_transaction, 'rw', run_in_tx, fun, *args, **kwargs)
         else:
             # No threading during testing
-            return defer.execute(run_in_tx, fun, *args, **kwargs)
+            return defer.execute(_run_in_transaction, 'rw', run_in_tx, fun, *args, **kwargs)
     return wrapper
 
 
-def ro_transact(fun=None, proxy=True):
+def async_transact(fun=None, pool='rw', priority=None, retries=None):
     if fun is None:
         def wrapper(fun):
-            return _ro_transact(fun, proxy)
+            return _async_transact(fun, pool, priority, retries)
         return wrapper
-    return _ro_transact(fun, proxy)
+    return _async_transact(fun, pool, priority, retries)
+
+
+class AsyncTransaction(object):
+    """A ZODB transaction driving an inlineCallbacks-style generator.
+
+    The transaction has its own connection and transaction manager, so that it can survive
+    across worker threads: each `step` runs in whatever worker thread is free, binds the
+    connection to that thread (so that `get_root()` etc. work as usual) and runs the generator
+    until it yields a Deferred or finishes, in which case the transaction is committed.
+
+    Generator code must not use the module level `transaction` functions, which operate
+    on the transaction of the current thread.
+    """
+
+    def __init__(self, fun, args, kwargs):
+        self.fun = fun
+        self.args = args
+        self.kwargs = kwargs
+        self.context = context_from_method(fun, args, kwargs)
+
+        self.transaction_manager = None
+        self.connection = None
+        self.generator = None
+        self.commit_time = None
+
+    def step(self, value=None, failure=None):
+        """Returns `(False, deferred)` when the generator is waiting, `(True, result)` when it's done."""
+        previous_connection = getattr(_connection, 'x', None)
+        _context.x = self.context
+        try:
+            if self.connection is None:
+                self._begin()
+            _connection.x = self.connection
+
+            if not inspect.isgenerator(self.generator):
+                # the decorated function didn't yield anything
+                return True, self._finish(self.generator)
+
+            while True:
+                try:
+                    if failure is not None:
+                        yielded, failure = failure.throwExceptionIntoGenerator(self.generator), None
+                    else:
+                        yielded = self.generator.send(value)
+                except StopIteration:
+                    return True, self._finish(None)
+                except defer._DefGen_Return as e:
+                    return True, self._finish(e.value)
+
+                if isinstance(yielded, defer.Deferred):
+                    return False, yielded
+                # like inlineCallbacks, plain values are sent back right away
+                value = yielded
+        except RollbackException:
+            self._abort()
+            return True, None
+        except:
+            self._abort()
+            raise
+        finally:
+            _context.x = None
+            if previous_connection is None:
+                _connection.__dict__.pop('x', None)
+            else:
+                _connection.x = previous_connection
+
+    def _begin(self):
+        if not _db:
+            raise Exception('DB not initalized')
+
+        if _testing:
+            # no threading during testing
+            self.transaction_manager = transaction.manager
+            self.connection = get_connection()
+        else:
+            self.transaction_manager = transaction.TransactionManager()
+            self.connection = get_db().open(transaction_manager=self.transaction_manager)
+
+        self.transaction_manager.begin()
+        _connection.x = self.connection
+        self.generator = self.fun(*self.args, **self.kwargs)
+
+    def _finish(self, result):
+        if isinstance(result, RollbackValue):
+            result = result.value
+            self._abort()
+        else:
+            commit_started = time.time()
+            self.transaction_manager.commit()
+            self.commit_time = time.time() - commit_started
+            self._close()
+        return make_persistent_proxy(result, self.context)
+
+    def _abort(self):
+        if self.transaction_manager is not None:
+            self.transaction_manager.abort()
+        self._close()
+
+    def _close(self):
+        if self.connection is not None and not _testing:
+            self.connection.close()
+        self.connection = None
+
+
+def _async_transact(fun, pool='rw', priority=None, retries=None):
+    """Like `transact` but for inlineCallbacks-style generators: waiting for yielded Deferreds
+    doesn't keep a worker thread busy, use it instead of `opennode.oms.util.blocking_yield`.
+
+    The transaction stays open while waiting, and is committed when the generator returns
+    (with `defer.returnValue`). On conflicts the whole generator is run again, so the
+    asynchronous operations it performs should be idempotent.
 
+        >>> @db.async_transact
+        ... def set_owner(obj, username):
+        ...     principal = yield lookup_principal(username)
+        ...     obj.__owner__ = principal
 
-def _ro_transact(fun, proxy=True):
+    """
+    if retries is not None and retries < 0:
+        raise Exception("Invalid number of conflict retries %s" % retries)
+
+    get_threadpool(pool)
+    priority = get_priority(pool, priority)
+
+    profile = profiler.profile_for(fun, 'async')
+
+    def run_in_threadpool(f, *args, **kwargs):
+        if not _testing:
+            return defer_to_threadpool(pool, priority, _run_in_transaction, 'rw', f, *args, **kwargs)
+        else:
+            return defer.execute(_run_in_transaction, 'rw', f, *args, **kwargs)
+
+    @functools.wraps(fun)
+    @defer.inlineCallbacks
+    def wrapper(*args, **kwargs):
+        max_retries = retries if retries is not None else get_config().getint('db', 'conflict_retries')
+
+        started = time.time()
+        for i in xrange(0, max_retries + 1):
+            tx = AsyncTransaction(fun, args, kwargs)
+            try:
+                done, value = yield run_in_threadpool(tx.step)
+                while not done:
+                    try:
+                        result = yield value
+                    except Exception:
+                        done, value = yield run_in_threadpool(tx.step, failure=Failure())
+                    else:
+                        done, value = yield run_in_threadpool(tx.step, result)
+            except ConflictError as e:
+                profiler.record_conflict(profile, e, read=isinstance(e, ReadConflictError),
+                                         retried=i < max_retries)
+                if i < max_retries:
+                    yield task.deferLater(reactor, conflict_backoff(i), lambda: None)
+            except:
+                profiler.record(profile, time.time() - started, error=True)
+                raise
+            else:
+                profiler.record(profile, time.time() - started, commit=tx.commit_time,
+                                committed=tx.commit_time is not None)
+                defer.returnValue(value)
+
+        log.warning("Giving up %s after %s conflicting attempts", profile.name, max_retries + 1)
+        profiler.record(profile, time.time() - started, error=True, exhausted=True)
+        raise e
+    return wrapper
+
+
+def ro_transact(fun=None, proxy=True, pool='ro', priority=None, snapshot=False):
+    if fun is None:
+        def wrapper(fun):
+            return _ro_transact(fun, proxy, pool, priority, snapshot)
+        return wrapper
+    return _ro_transact(fun, proxy, pool, priority, snapshot)
+
+
+def _ro_transact(fun, proxy=True, pool='ro', priority=None, snapshot=False):
     """Runs a callable inside a separate thread within a readonly ZODB transaction.
 
-    Transaction is always rolledback.
+    Transaction is always rolledback. See `transact` for `pool` and `priority`.
+
+    When called from a thread already running a transaction, the function is simply run
+    within it and the returned deferred has already fired.
 
     Returned values are deeply copied. Currently only zodb objects returned directly or
     contained in the first level content of lists/sets/dicts are copied.
 
+    `snapshot=True` returns plain data instead of proxies, see `transact`.
+
     """
 
-    if not _threadpool:
-        init_threadpool()
+    get_threadpool(pool)
+    priority = get_priority(pool, priority)
+
+    profile = profiler.profile_for(fun, 'ro')
 
     @functools.wraps(fun)
     def run_in_tx(fun, *args, **kwargs):
@@ -283,29 +691,37 @@ def _ro_transact(fun, proxy=True):
         if not _db:
             raise Exception('DB not initalized')
 
+        started = time.time()
+        error = True
         try:
             transaction.begin()
             _context.x = None
 
             res = fun(*args, **kwargs)
-            if proxy:
-                return make_persistent_proxy(res, context)
+            if snapshot:
+                res = make_snapshot(res)
+            elif proxy:
+                res = make_persistent_proxy(res, context)
+            error = False
             return res
         finally:
             transaction.abort()
+            profiler.record(profile, time.time() - started, error=error)
 
     @functools.wraps(fun)
     def wrapper(*args, **kwargs):
+        if current_transaction_kind() is not None:
+            d = defer.execute(fun, *args, **kwargs)
+            return d.addCallback(make_snapshot) if snapshot else d
         if not _testing:
-            return deferToThreadPool(reactor, _threadpool,
-                                     run_in_tx, fun, *args, **kwargs)
+            return defer_to_threadpool(pool, priority, _run_in_transaction, 'ro', run_in_tx, fun, *args, **kwargs)
         else:
-            return defer.execute(run_in_tx, fun, *args, **kwargs)
+            return defer.execute(_run_in_transaction, 'ro', run_in_tx, fun, *args, **kwargs)
     return wrapper
 
 
 def data_integrity_validator(fun):
-    """Runs a callable inside all available threads in the threadpool within a readonly ZODB transaction.
+    """Runs a callable inside all available threads in the threadpools within a readonly ZODB transaction.
 
     Calls function that is expected to assert some expectations about DB data and throw an exception if
     anything is wrong.
@@ -321,8 +737,7 @@ def data_integrity_validator(fun):
     Transaction is always rolled back.
     """
 
-    if not _threadpool:
-        init_threadpool()
+    get_threadpools()
 
     _done_threads = set()
     _all_done = threading.Event()
@@ -362,15 +777,16 @@ def data_integrity_validator(fun):
         if not _testing:
             deferred_list = []
 
-            if len(_threadpool.working) > 0:
-                log.info('integrity: There are working threads while testing %s: %s',
-                         fun, _threadpool.working)
+            for pool in get_threadpools().values():
+                if len(pool.working) > 0:
+                    log.info('integrity: There are working threads in %s while testing %s: %s',
+                             pool.name, fun, pool.working)
 
-            for thread in _threadpool.waiters:
-                if thread in _done_threads:
-                    continue
-                d = deferToThreadPool(reactor, _threadpool, run_in_tx, fun, *args, **kwargs)
-                deferred_list.append(d)
+                for thread in pool.waiters:
+                    if thread in _done_threads:
+                        continue
+                    d = deferToThreadPool(reactor, pool, run_in_tx, fun, *args, **kwargs)
+                    deferred_list.append(d)
 
             dl = defer.DeferredList(deferred_list)
             _all_done.set()
@@ -1,6 +1,6 @@
-from grokcore.component import querySubscriptions
 from zope.interface import Interface
 
+from opennode.oms.util import query_subscriptions
 from opennode.oms.zodb.proxy import get_peristent_context
 
 
@@ -28,7 +28,7 @@ def context_from_method(fun, args, kwargs):
     context = get_peristent_context(that)
 
     if that:
-        extractors = querySubscriptions(that, IContextExtractor)
+        extractors = query_subscriptions(that, IContextExtractor)
         if extractors:
             for i in extractors:
                 context.update(i.get_context())
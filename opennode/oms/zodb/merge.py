@@ -0,0 +1,90 @@
+"""Three-way merge of the states of a persistent object, used for ZODB conflict resolution.
+
+A merge policy is a callable taking the `old`, `saved` (committed by the other transaction) and
+`new` (being committed) values of an attribute which has been changed on both sides, and returning
+the merged value or raising `ConflictError` when the changes cannot be reconciled.
+Attributes missing from a state are passed as `MISSING`.
+
+"""
+from ZODB.POSException import ConflictError
+
+
+__all__ = ['MISSING', 'merge_states', 'merge_max', 'merge_set_union', 'merge_last_writer',
+           'merge_conflict']
+
+
+class _Missing(object):
+
+    def __repr__(self):
+        return 'MISSING'
+
+MISSING = _Missing()
+
+
+SCALAR_TYPES = (basestring, bool, int, long, float, type(None))
+
+
+def same(a, b):
+    """Equality which doesn't choke on persistent references.
+
+    Conflict resolution sees references to other persistent objects as `PersistentReference`s,
+    which raise ValueError when compared with a reference to a different object.
+    """
+    if a is b:
+        return True
+    try:
+        return a == b
+    except ValueError:
+        return False
+
+
+def merge_max(old, saved, new):
+    """Takes the highest value, e.g. for modification timestamps"""
+    return max(i for i in (saved, new) if i is not MISSING)
+
+
+def merge_set_union(old, saved, new):
+    """Keeps the elements added on either side and drops the elements removed on either side"""
+    old, saved, new = [set() if i in (MISSING, None) else set(i) for i in (old, saved, new)]
+    return type(new)((saved & new) | (saved - old) | (new - old))
+
+
+def merge_last_writer(old, saved, new):
+    """The transaction being committed wins"""
+    return new
+
+
+def merge_conflict(old, saved, new):
+    raise ConflictError("Conflicting changes of a field without merge policy")
+
+
+def default_policy(old, saved, new):
+    """Scalars are resolved with `merge_last_writer`, anything else is an unresolvable conflict"""
+    if all(i is MISSING or isinstance(i, SCALAR_TYPES) for i in (saved, new)):
+        return merge_last_writer(old, saved, new)
+    return merge_conflict(old, saved, new)
+
+
+def merge_states(old, saved, new, policies={}, default=default_policy):
+    """Merges the `__getstate__` dictionaries of a persistent object.
+
+    Attributes changed only on one side are taken from that side; attributes changed on both
+    sides to different values are resolved by `policies[name]`, or by `default`.
+    """
+    if not all(isinstance(i, dict) for i in (old, saved, new)):
+        raise ConflictError("Cannot merge non dict states")
+
+    merged = {}
+    for name in set(old).union(saved).union(new):
+        o, s, n = (state.get(name, MISSING) for state in (old, saved, new))
+
+        if same(s, n) or same(o, s):
+            value = n
+        elif same(o, n):
+            value = s
+        else:
+            value = policies.get(name, default)(o, s, n)
+
+        if value is not MISSING:
+            merged[name] = value
+    return merged
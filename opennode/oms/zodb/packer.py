@@ -1,13 +1,104 @@
+"""Periodic packing of the database, see `[db] pack_interval` and `[db] pack_days`.
+
+Packs run on a dedicated thread, outside of the zodb threadpools, so that they never hold a db
+thread nor a connection. With ZEO the pack is performed by the server through the storage API,
+the thread just waits for it to complete.
+
+"""
+import logging
+import os
+import subprocess
 import time
 
-from twisted.internet import defer
+from grokcore.component import Subscription, context
+from twisted.internet import defer, reactor
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
+from zope import schema
 from zope.component import provideSubscriptionAdapter
-from zope.interface import implements
+from zope.interface import Interface, implements
 
 from opennode.oms.config import get_config
+from opennode.oms.model.model.base import Model, IContainerExtender
 from opennode.oms.model.model.proc import IProcess, Proc, DaemonProcess
 from opennode.oms.util import subscription_factory, async_sleep
 from opennode.oms.zodb import db
+from opennode.oms.zodb.stats import DbStats
+
+
+log = logging.getLogger(__name__)
+
+_threadpool = None
+
+
+class PackStatistics(object):
+
+    def __init__(self):
+        self.packs = 0
+        self.errors = 0
+        self.running = False
+        self.last_started = None
+        self.last_duration = None
+        self.last_reclaimed = None
+        self.last_error = None
+        self.total_reclaimed = 0
+        self.size = None
+
+
+pack_stats = PackStatistics()
+
+
+def get_pack_threadpool():
+    global _threadpool
+    if _threadpool is None:
+        _threadpool = ThreadPool(minthreads=0, maxthreads=1, name='zodb-pack')
+        reactor.callWhenRunning(_threadpool.start)
+        reactor.addSystemEventTrigger('during', 'shutdown', _threadpool.stop)
+    return _threadpool
+
+
+def get_storage_size():
+    path = os.path.join(db.get_db_dir(), 'data.fs')
+    if os.path.exists(path):
+        return os.path.getsize(path)
+    return db.get_db().getSize()
+
+
+def set_idle_io_priority():
+    """Moves the calling thread to the idle I/O scheduling class (Linux only), so that an
+    embedded pack only uses the disk when nobody else does."""
+    try:
+        tid = os.readlink('/proc/thread-self').split('/')[-1]
+        subprocess.check_call(['ionice', '-c', '3', '-p', tid])
+    except (OSError, subprocess.CalledProcessError) as e:
+        log.warning('Cannot lower the I/O priority of the pack thread: %s', e)
+
+
+def pack_database(days):
+    """Removes the object revisions older than `days` days. Blocks until the pack is done."""
+    if get_config().getboolean('db', 'pack_io_idle', True):
+        set_idle_io_priority()
+
+    size = get_storage_size()
+    pack_stats.running = True
+    pack_stats.last_started = started = time.time()
+    try:
+        db.get_db().pack(days=days)
+    except Exception as e:
+        # e.g. FileStorage refuses to pack when nothing changed since the last pack
+        pack_stats.errors += 1
+        pack_stats.last_error = str(e)
+        log.info('Database not packed: %s', e)
+    else:
+        pack_stats.packs += 1
+        pack_stats.last_error = None
+        pack_stats.size = get_storage_size()
+        pack_stats.last_reclaimed = size - pack_stats.size
+        pack_stats.total_reclaimed += pack_stats.last_reclaimed
+        log.info('Packed database, %s bytes reclaimed', pack_stats.last_reclaimed)
+    finally:
+        pack_stats.running = False
+        pack_stats.last_duration = time.time() - started
 
 
 class PackDaemonProcess(DaemonProcess):
@@ -20,6 +111,7 @@ class PackDaemonProcess(DaemonProcess):
 
         config = get_config()
         self.interval = config.getint('db', 'pack_interval')
+        self.days = config.getfloat('db', 'pack_days', 0)
 
     @defer.inlineCallbacks
     def run(self):
@@ -34,15 +126,58 @@ class PackDaemonProcess(DaemonProcess):
 
             yield async_sleep(self.interval)
 
-    @db.ro_transact
     def pack(self):
-        storage_type = get_config().get('db', 'storage_type')
-
-        if storage_type == 'zeo':
-            print "[db_pack] zeo pack not implemented yet, please setup cron to run bin/zeopack -u db/socket"
-        elif storage_type == 'embedded':
-            d = db.get_db()
-            d.pack(time.time())
+        if get_config().get('db', 'storage_type') not in ('zeo', 'embedded'):
+            return defer.succeed(None)
+        return deferToThreadPool(reactor, get_pack_threadpool(), pack_database, self.days)
 
 
 provideSubscriptionAdapter(subscription_factory(PackDaemonProcess), adapts=(Proc,))
+
+
+class IPackStats(Interface):
+    """Outcome of the database packs"""
+    packs = schema.Int(title=u"packs", description=u"Completed packs since startup", readonly=True)
+    errors = schema.Int(title=u"errors", description=u"Failed or refused packs since startup", readonly=True)
+    running = schema.Bool(title=u"running", description=u"A pack is in progress", readonly=True)
+    last_started = schema.Float(title=u"last started", description=u"Start time of the last pack",
+                                readonly=True, required=False)
+    last_duration = schema.Float(title=u"last duration", description=u"Duration of the last pack in seconds",
+                                 readonly=True, required=False)
+    last_reclaimed = schema.Int(title=u"last reclaimed", description=u"Bytes reclaimed by the last pack",
+                                readonly=True, required=False)
+    last_error = schema.TextLine(title=u"last error", description=u"Why the last pack failed",
+                                 readonly=True, required=False)
+    total_reclaimed = schema.Int(title=u"total reclaimed", description=u"Bytes reclaimed since startup",
+                                 readonly=True)
+    size = schema.Int(title=u"size", description=u"Size of the database after the last pack",
+                      readonly=True, required=False)
+
+
+class PackStats(Model):
+    implements(IPackStats)
+
+    __name__ = 'pack'
+
+    def __str__(self):
+        return 'Database packs'
+
+    packs = property(lambda self: pack_stats.packs)
+    errors = property(lambda self: pack_stats.errors)
+    running = property(lambda self: pack_stats.running)
+    last_started = property(lambda self: pack_stats.last_started)
+    last_duration = property(lambda self: pack_stats.last_duration)
+    last_reclaimed = property(lambda self: pack_stats.last_reclaimed)
+    last_error = property(lambda self: pack_stats.last_error)
+    total_reclaimed = property(lambda self: pack_stats.total_reclaimed)
+    size = property(lambda self: pack_stats.size)
+
+
+class PackStatsExtension(Subscription):
+    implements(IContainerExtender)
+    context(DbStats)
+
+    names = ('pack', )
+
+    def extend(self):
+        return {'pack': PackStats()}
@@ -0,0 +1,234 @@
+"""Aggregated statistics about the transactions run by @db.transact and @db.ro_transact.
+
+Profiles are allocated once per decorated function at decoration time, so that recording
+a transaction only costs a few additions; nothing is formatted until a report is requested.
+
+"""
+import bisect
+import inspect
+import threading
+import time
+
+from collections import deque
+
+from ZODB.utils import oid_repr
+
+
+__all__ = ['profiler', 'Histogram', 'TransactionProfile', 'TransactionProfiler']
+
+
+class Histogram(object):
+    """Fixed buckets histogram of durations in seconds"""
+
+    BOUNDS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.buckets[bisect.bisect_left(self.BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def avg(self):
+        return self.total / self.count if self.count else 0.0
+
+    def as_dict(self):
+        labels = ['<=%s' % i for i in self.BOUNDS] + ['>%s' % self.BOUNDS[-1]]
+        return dict(zip(labels, self.buckets))
+
+
+class TransactionProfile(object):
+    """Counters of a single decorated function"""
+
+    def __init__(self, fun, kind, id):
+        self.fun = fun
+        self.kind = kind
+        self.id = id
+        self.name = '%s.%s' % (getattr(fun, '__module__', None), getattr(fun, '__name__', repr(fun)))
+        self._lineno = None
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.commits = 0
+        self.rollbacks = 0
+        self.errors = 0
+        self.retries = 0
+        self.exhausted = 0
+        self.read_conflicts = 0
+        self.write_conflicts = 0
+        self.wall = Histogram()
+        self.commit = Histogram()
+
+    @property
+    def lineno(self):
+        """Source line of the decorated function, computed only when needed for tracing"""
+        if self._lineno is None:
+            try:
+                self._lineno = inspect.getsourcelines(self.fun)[1]
+            except (IOError, TypeError):
+                self._lineno = '?'
+        return self._lineno
+
+    def as_dict(self):
+        return dict(id=self.id, name=self.name, kind=self.kind, calls=self.calls, commits=self.commits,
+                    rollbacks=self.rollbacks, errors=self.errors, retries=self.retries, exhausted=self.exhausted,
+                    read_conflicts=self.read_conflicts, write_conflicts=self.write_conflicts,
+                    wall_avg=self.wall.avg, wall_max=self.wall.max, wall_histogram=self.wall.as_dict(),
+                    commit_avg=self.commit.avg, commit_max=self.commit.max,
+                    commit_histogram=self.commit.as_dict())
+
+
+class ConflictCounter(object):
+    """Conflicts which happened on a given persistent object"""
+
+    def __init__(self, oid, class_name):
+        self.oid = oid
+        self.class_name = class_name
+        self.read_conflicts = 0
+        self.write_conflicts = 0
+        self.recent_conflicts = 0
+        self.functions = set()
+
+    @property
+    def id(self):
+        if self.oid is None:
+            return 'unknown-%s' % self.class_name
+        return oid_repr(self.oid)
+
+    def as_dict(self):
+        return dict(oid=self.id, class_name=self.class_name, read_conflicts=self.read_conflicts,
+                    write_conflicts=self.write_conflicts, recent_conflicts=self.recent_conflicts,
+                    functions=sorted(self.functions))
+
+
+class TransactionProfiler(object):
+
+    # how many of the most recent conflicts are kept for the rolling hotspot report
+    RECENT_CONFLICTS = 1000
+
+    def __init__(self, window=300):
+        self.window = window
+        self.lock = threading.Lock()
+        self.profiles = {}
+        self.conflicts = {}
+        self.recent = deque(maxlen=self.RECENT_CONFLICTS)
+
+    def profile_for(self, fun, kind):
+        # functions decorated at runtime (closures, lambdas) share the profile of their code
+        key = (getattr(fun, '__code__', fun), kind)
+        with self.lock:
+            if key not in self.profiles:
+                self.profiles[key] = TransactionProfile(fun, kind, self._unique_id(fun, kind))
+            return self.profiles[key]
+
+    def _unique_id(self, fun, kind):
+        base = '%s-%s' % (getattr(fun, '__name__', 'unknown'), kind)
+        taken = set(i.id for i in self.profiles.values())
+        id, n = base, 1
+        while id in taken:
+            n += 1
+            id = '%s-%s' % (base, n)
+        return id
+
+    def record(self, profile, wall, commit=None, committed=False, error=False, exhausted=False):
+        with self.lock:
+            profile.calls += 1
+            if exhausted:
+                profile.exhausted += 1
+            profile.wall.add(wall)
+            if commit is not None:
+                profile.commit.add(commit)
+            if error:
+                profile.errors += 1
+            elif committed:
+                profile.commits += 1
+            else:
+                profile.rollbacks += 1
+
+    def record_conflict(self, profile, exc, read, retried=True):
+        """Records a conflict of a `profile` transaction, `retried` is False when the conflict
+        exhausted the retries"""
+        oid = getattr(exc, 'oid', None)
+        class_name = getattr(exc, 'class_name', None)
+
+        with self.lock:
+            if retried:
+                profile.retries += 1
+            if read:
+                profile.read_conflicts += 1
+            else:
+                profile.write_conflicts += 1
+
+            # one counter per object, objects of unknown oid are told apart by their class only
+            key = oid if oid is not None else (None, class_name)
+            if key not in self.conflicts:
+                self.conflicts[key] = ConflictCounter(oid, class_name)
+            counter = self.conflicts[key]
+            if counter.class_name is None:
+                # read conflicts don't always know the class
+                counter.class_name = class_name
+            if read:
+                counter.read_conflicts += 1
+            else:
+                counter.write_conflicts += 1
+            counter.recent_conflicts += 1
+            counter.functions.add(profile.name)
+
+            now = time.time()
+            self._expire_recent(now)
+            self.recent.append((now, counter))
+
+    def _expire_recent(self, now):
+        # make room explicitly when full, since append() would silently drop the oldest entry
+        while self.recent and (len(self.recent) == self.recent.maxlen or
+                               self.recent[0][0] < now - self.window):
+            timestamp, counter = self.recent.popleft()
+            counter.recent_conflicts -= 1
+
+    def hotspots(self):
+        """Returns the objects which caused conflicts in the last `window` seconds, most conflicting first"""
+        with self.lock:
+            self._expire_recent(time.time())
+            counters = [i for i in self.conflicts.values() if i.recent_conflicts]
+        return sorted(counters, key=lambda i: i.recent_conflicts, reverse=True)
+
+    def reset(self):
+        with self.lock:
+            for profile in self.profiles.values():
+                profile.reset()
+            self.conflicts.clear()
+            self.recent.clear()
+
+    def get_profiles(self):
+        """Returns the profiles of the functions which have run at least once"""
+        with self.lock:
+            return [i for i in self.profiles.values() if i.calls]
+
+    def get_profile(self, id):
+        for profile in self.get_profiles():
+            if profile.id == id:
+                return profile
+
+    def get_conflicts(self):
+        with self.lock:
+            self._expire_recent(time.time())
+            return self.conflicts.values()
+
+    def report(self):
+        return dict(transactions=[i.as_dict() for i in self.get_profiles()],
+                    conflicts=[i.as_dict() for i in self.get_conflicts()],
+                    hotspots=[i.as_dict() for i in self.hotspots()])
+
+
+profiler = TransactionProfiler()
@@ -1,6 +1,8 @@
 # adapted from generic python proxy code available at http://code.activestate.com/recipes/252151-generalized-delegates-and-proxies/
 # credit to Goncalo Rodrigues on Tue, 18 Nov 2003 (PSF)
 
+import inspect
+
 from twisted.python.threadable import isInIOThread
 from twisted.python import log
 from twisted.internet import defer
@@ -11,20 +13,77 @@ from opennode.oms.config import get_config
 __all__ = ['PersistentProxy', 'make_persistent_proxy']
 
 
-def make_persistent_proxy(res, context={}):
-    import inspect
+# instances of these types (and subclasses) are returned without proxying
+_UNPROXIED_TYPES = (type(None), type, basestring, int, long, float, defer.Deferred)
 
-    if res is None:
-        return None
-    if isinstance(res, type):
-        return res
-    if any((isinstance(res, basestring), isinstance(res, int), isinstance(res, float),
-           isinstance(res, defer.Deferred))):
-        return res
+# immutable containers are not proxied when all their elements are returned unproxied
+_IMMUTABLE_CONTAINERS = (tuple, frozenset)
+
+_method_wrapper_type = type([].__str__)
 
-    if inspect.isroutine(res) or res.__class__ == ([].__str__).__class__:
-        return CallableViralProxy(res, context)
-    return PersistentProxy(res, context)
+# maps types to their proxy factories, filled lazily by `make_persistent_proxy`
+_factories = {}
+
+# types whose instances cannot carry the `_v_context` attribute
+_contextless_types = set()
+
+
+def make_persistent_proxy(res, context={}):
+    cls = type(res)
+    try:
+        factory = _factories[cls]
+    except KeyError:
+        factory = _select_factory(res.__class__)
+        # objects lying about their class (e.g. proxies) cannot be dispatched by type
+        if res.__class__ is cls:
+            _factories[cls] = factory
+    return factory(res, context)
+
+
+def _select_factory(cls):
+    if issubclass(cls, _UNPROXIED_TYPES):
+        return _unproxied
+    if issubclass(cls, _IMMUTABLE_CONTAINERS):
+        return _immutable_container
+    if _is_routine_type(cls):
+        return CallableViralProxy
+    return PersistentProxy
+
+
+def _is_routine_type(cls):
+    """Same as `inspect.isroutine` (plus method-wrappers), but for types"""
+    if cls in (inspect.types.FunctionType, inspect.types.MethodType, inspect.types.BuiltinFunctionType):
+        return True
+    if issubclass(cls, _method_wrapper_type):
+        return True
+    # method descriptors, see `inspect.ismethoddescriptor`
+    return hasattr(cls, '__get__') and not hasattr(cls, '__set__')
+
+
+def _unproxied(res, context):
+    return res
+
+
+def _immutable_container(res, context):
+    for i in res:
+        if make_persistent_proxy(i, context) is not i:
+            return PersistentProxy(res, context)
+    return res
+
+
+def _set_context(obj, context):
+    """Attaches the context to the proxied object, so that it's found by methods invoked through
+    the proxy (where `self` is the unproxied object). Avoids rewriting it when it's already there."""
+    cls = type(obj)
+    if cls in _contextless_types:
+        return
+    try:
+        if getattr(obj, '_v_context', None) is not context:
+            obj._v_context = context
+    except AttributeError:
+        # cannot write to builtin objects
+        if cls.__dictoffset__ == 0 and cls.__setattr__ is object.__setattr__:
+            _contextless_types.add(cls)
 
 
 def remove_persistent_proxy(obj):
@@ -87,11 +146,7 @@ class PersistentProxy(object):
     def __init__(self, obj, context):
         # we want to keep the context even when we unproxy the object
         # like when a method is executed and `self` was a proxy
-        try:
-            obj._v_context = context
-        except AttributeError:
-            # cannot write to builting objects
-            pass
+        _set_context(obj, context)
 
         object.__setattr__(self, "_obj", obj)
         object.__setattr__(self, "_context", context)
@@ -105,8 +160,8 @@ class PersistentProxy(object):
         #ensure_fixed_up(self, name, 'read')
 
         res = getattr(object.__getattribute__(self, "_obj"), name)
-        if name not in ['__providedBy__']:
-            return make_persistent_proxy(res, get_peristent_context(self))
+        if name != '__providedBy__':
+            return make_persistent_proxy(res, object.__getattribute__(self, "_context"))
         return res
 
     def __delattr__(self, name):
@@ -153,13 +208,16 @@ class PersistentProxy(object):
         """creates a proxy for the given class"""
 
         def make_method(name):
-            def method(self, *args, **kw):
-                if name == '__cmp__':
+            if name == '__cmp__':
+                def method(self, *args, **kw):
                     return cmp(object.__getattribute__(self, "_obj"), *args)
-                res = getattr(object.__getattribute__(self, "_obj"), name)(*args, **kw)
-                if name in cls._proxied_specials:
-                    return make_persistent_proxy(res, get_peristent_context(self))
-                return res
+            elif name in cls._proxied_specials:
+                def method(self, *args, **kw):
+                    res = getattr(object.__getattribute__(self, "_obj"), name)(*args, **kw)
+                    return make_persistent_proxy(res, object.__getattribute__(self, "_context"))
+            else:
+                def method(self, *args, **kw):
+                    return getattr(object.__getattribute__(self, "_obj"), name)(*args, **kw)
             return method
 
         namespace = {}
@@ -193,15 +251,11 @@ class CallableViralProxy(PersistentProxy):
     def __init__(self, obj, context):
         # we want to keep the context even when we unproxy the object
         # like when a method is executed and `self` was a proxy
-        try:
-            obj._v_context = context
-        except AttributeError:
-            # cannot write to builting objects
-            pass
+        _set_context(obj, context)
 
         object.__setattr__(self, "_obj", obj)
         object.__setattr__(self, "_context", context)
 
     def __call__(self, *args, **kwargs):
         return make_persistent_proxy(object.__getattribute__(self, "_obj")(*args, **kwargs),
-                                     get_peristent_context(self))
+                                     object.__getattribute__(self, "_context"))
@@ -0,0 +1,83 @@
+"""Detached copies of transaction results, see the `snapshot` argument of `db.transact`.
+
+Snapshots are built inside the db thread and contain only plain data, so they can be freely
+used from the reactor thread without proxies and without keeping persistent objects alive.
+
+"""
+from collections import OrderedDict
+
+from persistent import Persistent
+from twisted.internet import defer
+
+
+__all__ = ['Snapshot', 'make_snapshot']
+
+
+# returned as they are, they are either immutable or not related to the db
+_PLAIN_TYPES = (type(None), type, basestring, int, long, float, defer.Deferred)
+
+
+class Snapshot(OrderedDict):
+    """Read-only copy of the schema fields of a model, plus its `__name__`"""
+
+    def __init__(self, items=()):
+        OrderedDict.__init__(self)
+        for key, value in items:
+            OrderedDict.__setitem__(self, key, value)
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Snapshots are read-only")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _readonly
+
+
+def make_snapshot(obj):
+    """Converts `obj` into plain data, recursively.
+
+    Models become `Snapshot`s of their schema fields (children of containers are not included),
+    mappings become dicts (preserving their order), sequences become tuples and sets frozensets.
+    Must be called within a transaction.
+    """
+    return _snapshot(obj, {})
+
+
+def _snapshot(obj, memo):
+    from opennode.oms.model.model.base import Model
+    from opennode.oms.model.schema import model_to_dict
+
+    if isinstance(obj, _PLAIN_TYPES):
+        return obj
+
+    # the originals are kept alive by the memo, as values computed on access (e.g. by
+    # properties) could be freed and their ids reused by other objects
+    key = id(obj)
+    if key in memo:
+        return memo[key][1]
+
+    if isinstance(obj, Model):
+        items = model_to_dict(obj).items()
+        items.insert(0, ('__name__', obj.__name__))
+        res = Snapshot(items)
+        memo[key] = (obj, res)
+        # fields referencing other models are snapshotted as well
+        for name, value in items:
+            OrderedDict.__setitem__(res, name, _snapshot(value, memo))
+        return res
+
+    if isinstance(obj, dict) or hasattr(obj, 'iteritems'):
+        res = OrderedDict() if isinstance(obj, OrderedDict) else {}
+        memo[key] = (obj, res)
+        for name, value in obj.iteritems():
+            res[_snapshot(name, memo)] = _snapshot(value, memo)
+        return res
+
+    if isinstance(obj, (set, frozenset)):
+        return frozenset(_snapshot(i, memo) for i in obj)
+
+    if isinstance(obj, (list, tuple)) or hasattr(obj, '__iter__') and hasattr(obj, '__getitem__'):
+        return tuple(_snapshot(i, memo) for i in obj)
+
+    if isinstance(obj, Persistent):
+        raise Exception("Cannot snapshot persistent object %r" % (obj, ))
+
+    return obj
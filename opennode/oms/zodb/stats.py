@@ -0,0 +1,222 @@
+from __future__ import absolute_import
+
+from grokcore.component import Subscription, context
+from zope import schema
+from zope.interface import Interface, implements
+
+from opennode.oms.model.model.base import Model, ReadonlyContainer, IContainerExtender
+from opennode.oms.model.model.proc import Proc
+from opennode.oms.zodb.profiler import profiler
+
+
+class IThreadPoolStats(Interface):
+    """Usage statistics of a zodb threadpool"""
+    max_threads = schema.Int(title=u"max threads", description=u"Maximum number of threads",
+                             readonly=True)
+    workers = schema.Int(title=u"workers", description=u"Number of started threads", readonly=True)
+    busy = schema.Int(title=u"busy", description=u"Threads currently running a job", readonly=True)
+    idle = schema.Int(title=u"idle", description=u"Threads waiting for a job", readonly=True)
+    queued = schema.Int(title=u"queued", description=u"Jobs waiting for a free thread", readonly=True)
+    queued_interactive = schema.Int(title=u"queued interactive",
+                                    description=u"Interactive jobs waiting for a free thread", readonly=True)
+    queued_background = schema.Int(title=u"queued background",
+                                   description=u"Background jobs waiting for a free thread", readonly=True)
+    submitted = schema.Int(title=u"submitted", description=u"Jobs submitted since startup", readonly=True)
+    completed = schema.Int(title=u"completed", description=u"Jobs completed since startup", readonly=True)
+    yielded = schema.Int(title=u"yielded", description=u"Background jobs held back by interactive jobs",
+                         readonly=True)
+    wait_avg = schema.Float(title=u"average wait", description=u"Average queueing time in seconds",
+                            readonly=True)
+    wait_max = schema.Float(title=u"max wait", description=u"Maximum queueing time in seconds",
+                            readonly=True)
+    wait_last = schema.Float(title=u"last wait", description=u"Queueing time of the last started job",
+                             readonly=True)
+    run_avg = schema.Float(title=u"average run", description=u"Average job execution time in seconds",
+                           readonly=True)
+
+
+class ThreadPoolStats(Model):
+    implements(IThreadPoolStats)
+
+    def __init__(self, parent, name):
+        self.__parent__ = parent
+        self.__name__ = name
+
+    def __str__(self):
+        return 'Threadpool %s' % self.__name__
+
+    @property
+    def _stats(self):
+        from opennode.oms.zodb import db
+        return db.get_threadpool(self.__name__).stats()
+
+    max_threads = property(lambda self: self._stats['max_threads'])
+    workers = property(lambda self: self._stats['workers'])
+    busy = property(lambda self: self._stats['busy'])
+    idle = property(lambda self: self._stats['idle'])
+    queued = property(lambda self: self._stats['queued'])
+    queued_interactive = property(lambda self: self._stats['queued_interactive'])
+    queued_background = property(lambda self: self._stats['queued_background'])
+    submitted = property(lambda self: self._stats['submitted'])
+    completed = property(lambda self: self._stats['completed'])
+    yielded = property(lambda self: self._stats['yielded'])
+    wait_avg = property(lambda self: self._stats['wait_avg'])
+    wait_max = property(lambda self: self._stats['wait_max'])
+    wait_last = property(lambda self: self._stats['wait_last'])
+    run_avg = property(lambda self: self._stats['run_avg'])
+
+
+class ThreadPoolsStats(ReadonlyContainer):
+    __name__ = 'threadpools'
+
+    def __str__(self):
+        return 'zodb threadpools'
+
+    def content(self):
+        from opennode.oms.zodb import db
+        return dict((name, ThreadPoolStats(self, name)) for name in db.get_threadpools())
+
+
+class DbStats(ReadonlyContainer):
+    """Runtime statistics of the database layer.
+
+    Children are provided by IContainerExtender subscriptions.
+    """
+    __name__ = 'db'
+
+    def __str__(self):
+        return 'Database statistics'
+
+
+class DbStatsProcExtension(Subscription):
+    implements(IContainerExtender)
+    context(Proc)
+
+    names = ('db', )
+
+    def extend(self):
+        return {'db': DbStats()}
+
+
+class ThreadPoolsStatsExtension(Subscription):
+    implements(IContainerExtender)
+    context(DbStats)
+
+    names = ('threadpools', )
+
+    def extend(self):
+        return {'threadpools': ThreadPoolsStats()}
+
+
+class ITransactionStats(Interface):
+    """Profile of the transactions run by a @transact or @ro_transact decorated function"""
+    name = schema.TextLine(title=u"name", description=u"Decorated function", readonly=True)
+    kind = schema.TextLine(title=u"kind", description=u"Either 'rw' or 'ro'", readonly=True)
+    calls = schema.Int(title=u"calls", description=u"Transactions run", readonly=True)
+    commits = schema.Int(title=u"commits", description=u"Committed transactions", readonly=True)
+    rollbacks = schema.Int(title=u"rollbacks", description=u"Transactions rolled back without errors",
+                           readonly=True)
+    errors = schema.Int(title=u"errors", description=u"Transactions aborted by an exception", readonly=True)
+    retries = schema.Int(title=u"retries", description=u"Attempts repeated because of conflicts",
+                         readonly=True)
+    exhausted = schema.Int(title=u"exhausted", description=u"Transactions which ran out of conflict retries",
+                           readonly=True)
+    read_conflicts = schema.Int(title=u"read conflicts", description=u"ReadConflictErrors", readonly=True)
+    write_conflicts = schema.Int(title=u"write conflicts", description=u"ConflictErrors", readonly=True)
+    wall_avg = schema.Float(title=u"average time", description=u"Average transaction time in seconds",
+                            readonly=True)
+    wall_max = schema.Float(title=u"max time", description=u"Maximum transaction time in seconds",
+                            readonly=True)
+    commit_avg = schema.Float(title=u"average commit", description=u"Average commit time in seconds",
+                              readonly=True)
+    commit_max = schema.Float(title=u"max commit", description=u"Maximum commit time in seconds",
+                              readonly=True)
+
+
+class TransactionStats(Model):
+    implements(ITransactionStats)
+
+    def __init__(self, parent, profile):
+        self.__parent__ = parent
+        self.__name__ = profile.id
+        self._profile = profile
+
+    def __str__(self):
+        return 'Transactions of %s' % self._profile.name
+
+    name = property(lambda self: self._profile.name)
+    kind = property(lambda self: self._profile.kind)
+    calls = property(lambda self: self._profile.calls)
+    commits = property(lambda self: self._profile.commits)
+    rollbacks = property(lambda self: self._profile.rollbacks)
+    errors = property(lambda self: self._profile.errors)
+    retries = property(lambda self: self._profile.retries)
+    exhausted = property(lambda self: self._profile.exhausted)
+    read_conflicts = property(lambda self: self._profile.read_conflicts)
+    write_conflicts = property(lambda self: self._profile.write_conflicts)
+    wall_avg = property(lambda self: self._profile.wall.avg)
+    wall_max = property(lambda self: self._profile.wall.max)
+    commit_avg = property(lambda self: self._profile.commit.avg)
+    commit_max = property(lambda self: self._profile.commit.max)
+
+
+class TransactionsStats(ReadonlyContainer):
+    __name__ = 'transactions'
+
+    def __str__(self):
+        return 'zodb transaction profiles'
+
+    def content(self):
+        return dict((profile.id, TransactionStats(self, profile)) for profile in profiler.get_profiles())
+
+
+class IConflictStats(Interface):
+    """Conflicts which happened on a given persistent object"""
+    oid = schema.TextLine(title=u"oid", readonly=True)
+    class_name = schema.TextLine(title=u"class", readonly=True)
+    read_conflicts = schema.Int(title=u"read conflicts", description=u"ReadConflictErrors", readonly=True)
+    write_conflicts = schema.Int(title=u"write conflicts", description=u"ConflictErrors", readonly=True)
+    recent_conflicts = schema.Int(title=u"recent conflicts",
+                                  description=u"Conflicts in the last `[db] conflict_report_window` seconds",
+                                  readonly=True)
+    functions = schema.List(title=u"functions", description=u"Transactions which hit the conflict",
+                            value_type=schema.TextLine(), readonly=True)
+
+
+class ConflictStats(Model):
+    implements(IConflictStats)
+
+    def __init__(self, parent, counter):
+        self.__parent__ = parent
+        self.__name__ = counter.id
+        self._counter = counter
+
+    def __str__(self):
+        return 'Conflicts on %s' % self._counter.id
+
+    oid = property(lambda self: self._counter.id)
+    class_name = property(lambda self: self._counter.class_name)
+    read_conflicts = property(lambda self: self._counter.read_conflicts)
+    write_conflicts = property(lambda self: self._counter.write_conflicts)
+    recent_conflicts = property(lambda self: self._counter.recent_conflicts)
+    functions = property(lambda self: sorted(self._counter.functions))
+
+
+class ConflictsStats(ReadonlyContainer):
+    __name__ = 'conflicts'
+
+    def __str__(self):
+        return 'zodb conflicts'
+
+    def content(self):
+        return dict((counter.id, ConflictStats(self, counter)) for counter in profiler.get_conflicts())
+
+
+class TransactionProfilerExtension(Subscription):
+    implements(IContainerExtender)
+    context(DbStats)
+
+    names = ('transactions', 'conflicts')
+
+    def extend(self):
+        return {'transactions': TransactionsStats(), 'conflicts': ConflictsStats()}
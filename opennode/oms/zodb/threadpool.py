@@ -0,0 +1,243 @@
+import heapq
+import itertools
+import threading
+import time
+
+from Queue import Queue
+from twisted.python import context
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool, WorkerStop
+
+
+__all__ = ['MeteredThreadPool', 'PRIORITIES', 'INTERACTIVE', 'NORMAL', 'BACKGROUND']
+
+
+# Priority classes of the jobs submitted to the zodb threadpools, lower runs first.
+INTERACTIVE = 0
+NORMAL = 1
+BACKGROUND = 2
+
+PRIORITIES = {'interactive': INTERACTIVE,
+              'normal': NORMAL,
+              'background': BACKGROUND}
+
+# worker stop requests are served only after all the queued jobs
+_STOP = max(PRIORITIES.values()) + 1
+
+# returned in place of the result by the jobs put back in the queue
+_YIELDED = object()
+
+
+class PriorityJobQueue(Queue):
+    """A Queue which returns jobs ordered by priority class, in FIFO order within the same class.
+
+    Items have to be put as (priority, job) tuples, except for the threadpool `WorkerStop` marker.
+    """
+
+    def _init(self, maxsize):
+        self.queue = []
+        self.counter = itertools.count()
+
+    def _qsize(self, len=len):
+        return len(self.queue)
+
+    def _put(self, item):
+        if item is WorkerStop:
+            priority = _STOP
+        else:
+            priority, item = item
+        heapq.heappush(self.queue, (priority, next(self.counter), item))
+
+    def _get(self):
+        return heapq.heappop(self.queue)[2]
+
+
+class MeteredThreadPool(ThreadPool):
+    """A twisted ThreadPool which keeps track of how long jobs wait in the queue
+    before a worker thread picks them up, and how many of them are being run.
+
+    Queueing in front of the zodb threadpools is usually the dominant part of the
+    latency perceived by the clients, so these numbers are exposed in /proc/db.
+
+    Jobs are dequeued according to their priority class. Background jobs additionally
+    yield (up to `max_yield` seconds) while `yield_to()` returns true, which is used to
+    hold them back while interactive work is queued in any threadpool: they are put back
+    in the queue every `yield_interval` seconds by a single timer thread, without keeping
+    a worker thread busy. Jobs still held back when the pool is stopped fail.
+
+    """
+
+    def __init__(self, minthreads=5, maxthreads=20, name=None, yield_to=None, max_yield=1.0,
+                 yield_interval=0.01):
+        ThreadPool.__init__(self, minthreads, maxthreads, name)
+        self.q = PriorityJobQueue(0)
+        self.yield_to = yield_to
+        self.max_yield = max_yield
+        self.yield_interval = yield_interval
+        self._stats_lock = threading.Lock()
+        self._queued = dict((priority, 0) for priority in PRIORITIES.values())
+        # [(due time, sequence, priority, job)] heap of the jobs to be put back in the queue
+        self._delayed = []
+        self._delayed_counter = itertools.count()
+        self._delayed_cond = threading.Condition()
+        self._delayed_thread = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.jobs_submitted = 0
+            self.jobs_started = 0
+            self.jobs_completed = 0
+            self.jobs_yielded = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+            self.last_wait = 0.0
+            self.total_run = 0.0
+
+    def callInThreadWithCallback(self, onResult, func, *args, **kw):
+        self.callInThreadWithPriority(NORMAL, onResult, func, *args, **kw)
+
+    def callInThreadWithPriority(self, priority, onResult, func, *args, **kw):
+        """Like `callInThreadWithCallback` but the job is queued in the given priority class."""
+        if self.joined:
+            return
+
+        queued_at = time.time()
+        yield_deadline = []
+
+        def metered(*args, **kw):
+            self._dequeued(priority)
+            if priority == BACKGROUND and self._must_yield(yield_deadline):
+                self._requeue(priority, job)
+                return _YIELDED
+
+            started_at = time.time()
+            self._record_wait(started_at - queued_at)
+            try:
+                return func(*args, **kw)
+            finally:
+                self._record_run(time.time() - started_at)
+
+        def on_result(success, result):
+            if result is not _YIELDED and onResult is not None:
+                onResult(success, result)
+
+        with self._stats_lock:
+            self.jobs_submitted += 1
+            self._queued[priority] += 1
+
+        ctx = context.theContextTracker.currentContext().contexts[-1]
+        job = (ctx, metered, args, kw, on_result)
+        self.q.put((priority, job))
+        if self.started:
+            self._startSomeWorkers()
+
+    def _must_yield(self, deadline):
+        if self.yield_to is None or not self.yield_to():
+            return False
+
+        now = time.time()
+        if not deadline:
+            deadline.append(now + self.max_yield)
+            with self._stats_lock:
+                self.jobs_yielded += 1
+        return now < deadline[0]
+
+    def _requeue(self, priority, job):
+        with self._stats_lock:
+            self._queued[priority] += 1
+
+        with self._delayed_cond:
+            stopped = self.joined
+            if not stopped:
+                heapq.heappush(self._delayed, (time.time() + self.yield_interval, next(self._delayed_counter),
+                                               priority, job))
+                if self._delayed_thread is None or not self._delayed_thread.is_alive():
+                    self._delayed_thread = threading.Thread(target=self._put_delayed,
+                                                            name='%s-requeue' % self.name)
+                    self._delayed_thread.daemon = True
+                    self._delayed_thread.start()
+                self._delayed_cond.notify()
+        if stopped:
+            self._fail(priority, job)
+
+    def _put_delayed(self):
+        """Puts back in the queue the jobs whose delay is over, until the pool is stopped"""
+        with self._delayed_cond:
+            while not self.joined:
+                wait = self._delayed[0][0] - time.time() if self._delayed else None
+                if wait is None or wait > 0:
+                    self._delayed_cond.wait(wait)
+                    continue
+                _, _, priority, job = heapq.heappop(self._delayed)
+                self.q.put((priority, job))
+
+            delayed, self._delayed = self._delayed, []
+
+        for _, _, priority, job in delayed:
+            self._fail(priority, job)
+
+    def _fail(self, priority, job):
+        self._dequeued(priority)
+        on_result = job[4]
+        on_result(False, Failure(Exception("Threadpool %s stopped" % self.name)))
+
+    def stop(self):
+        ThreadPool.stop(self)
+        with self._delayed_cond:
+            self._delayed_cond.notify()
+        if self._delayed_thread is not None:
+            self._delayed_thread.join()
+
+    def _dequeued(self, priority):
+        with self._stats_lock:
+            self._queued[priority] -= 1
+
+    def _record_wait(self, wait):
+        with self._stats_lock:
+            self.jobs_started += 1
+            self.total_wait += wait
+            self.last_wait = wait
+            if wait > self.max_wait:
+                self.max_wait = wait
+
+    def _record_run(self, duration):
+        with self._stats_lock:
+            self.jobs_completed += 1
+            self.total_run += duration
+
+    def queued_with_priority(self, priority):
+        return self._queued[priority]
+
+    @property
+    def queued(self):
+        return self.q.qsize()
+
+    @property
+    def busy(self):
+        return len(self.working)
+
+    @property
+    def idle(self):
+        return len(self.waiters)
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(name=self.name,
+                        min_threads=self.min,
+                        max_threads=self.max,
+                        workers=self.workers,
+                        busy=self.busy,
+                        idle=self.idle,
+                        queued=self.queued,
+                        queued_interactive=self._queued[INTERACTIVE],
+                        queued_normal=self._queued[NORMAL],
+                        queued_background=self._queued[BACKGROUND],
+                        submitted=self.jobs_submitted,
+                        started=self.jobs_started,
+                        completed=self.jobs_completed,
+                        yielded=self.jobs_yielded,
+                        wait_avg=self.total_wait / self.jobs_started if self.jobs_started else 0.0,
+                        wait_max=self.max_wait,
+                        wait_last=self.last_wait,
+                        run_avg=self.total_run / self.jobs_completed if self.jobs_completed else 0.0)
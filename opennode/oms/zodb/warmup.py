@@ -0,0 +1,114 @@
+"""Loads the hot objects in the caches of all the db threads at startup.
+
+Every db thread has its own connection and object cache (see `db.get_connection`), so a warm-up
+job is run by each thread of each pool. Jobs wait for each other before returning, which forces
+the pool to spread them across distinct threads.
+
+"""
+import logging
+import threading
+import time
+
+import transaction
+from twisted.internet import defer
+
+from opennode.oms.config import get_config
+from opennode.oms.model.model.base import IContainer
+from opennode.oms.model.traversal import traverse1
+from opennode.oms.zodb import db
+
+
+__all__ = ['warm_up']
+
+
+log = logging.getLogger(__name__)
+
+
+class Rendezvous(object):
+    """Blocks threads until `parties` of them arrived or the `deadline` passed"""
+
+    def __init__(self, parties, deadline):
+        self.parties = parties
+        self.deadline = deadline
+        self.arrived = 0
+        self.condition = threading.Condition()
+
+    def wait(self):
+        with self.condition:
+            self.arrived += 1
+            self.condition.notify_all()
+            while self.arrived < self.parties:
+                remaining = self.deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+
+def warm_up():
+    """Opens the connections of all the db threads and loads `[db] warmup_paths` in their caches.
+
+    Returns a deferred which fires with the number of warmed up connections.
+    """
+    cfg = get_config()
+    paths = [i.strip() for i in cfg.getstring('db', 'warmup_paths', '').split(',') if i.strip()]
+    depth = cfg.getint('db', 'warmup_depth', 1)
+    started = time.time()
+    deadline = started + cfg.getfloat('db', 'warmup_timeout', 60)
+
+    if db._testing:
+        # no threads during testing
+        return defer.execute(_warm_up_connection, paths, depth, deadline, None).addCallback(lambda _: 1)
+
+    deferreds = []
+    for name, pool in db.get_threadpools().items():
+        rendezvous = Rendezvous(pool.max, deadline)
+        # threads of the readonly pool use the readonly replica connection, if any
+        kind = 'ro' if name == 'ro' else 'rw'
+        for i in xrange(pool.max):
+            deferreds.append(db.defer_to_threadpool(name, db.get_priority(name), db._run_in_transaction, kind,
+                                                    _warm_up_connection, paths, depth, deadline, rendezvous))
+
+    @defer.inlineCallbacks
+    def report():
+        results = yield defer.DeferredList(deferreds, consumeErrors=True)
+        warmed = [res for success, res in results if success and res is not None]
+        for success, res in results:
+            if not success:
+                log.warning('Cannot warm up zodb connection: %s', res.getErrorMessage())
+        log.info('Warmed up %s zodb connections with %s objects in %.2fs',
+                 len(warmed), sum(warmed), time.time() - started)
+        defer.returnValue(len(warmed))
+    return report()
+
+
+def _warm_up_connection(paths, depth, deadline, rendezvous):
+    try:
+        if time.time() > deadline:
+            return
+        transaction.begin()
+        db.get_connection()
+        loaded = 0
+        for path in paths:
+            obj = traverse1(path)
+            if obj is None:
+                log.debug('Warm-up path %s not found', path)
+                continue
+            loaded += _load(obj, depth)
+        return loaded
+    finally:
+        transaction.abort()
+        if rendezvous is not None:
+            rendezvous.wait()
+
+
+def _load(obj, depth):
+    loaded = 0
+    if getattr(obj, '_p_jar', None) is not None:
+        obj._p_activate()
+        loaded += 1
+    if depth > 0 and IContainer.providedBy(obj):
+        for child in obj.listcontent():
+            # skip the children computed on the fly, like the /proc entries
+            if getattr(child, '_p_jar', None) is not None:
+                loaded += _load(child, depth - 1)
+    return loaded
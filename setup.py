@@ -23,6 +23,7 @@ setup(
                                         'omspasswd = opennode.oms.security.passwd:run',
                                         'plugin = opennode.oms.plugin:run',
                                         'obj_graph = opennode.oms.tools.obj_graph:run',
+                                        'omscompress = opennode.oms.tools.compress_db:run',
                                         ]},
     install_requires = [
         "setuptools", # Redundant but removes a warning
@@ -38,6 +39,7 @@ setup(
         "zope.securitypolicy==3.7.0",
         "ipython>=0.11",
         "ZODB3==3.10.5",
+        "zc.zlibstorage==0.1.1",
         "pycrypto==2.6",
         "pyOpenSSL==0.13",
         "netaddr==0.7.6",